@@ -0,0 +1,81 @@
+# document_index_benchmark.py
+# Recall vs latency of exact and HNSW search over float16/int8 embeddings
+# on a synthetic clustered corpus. Run: python benchmarks/document_index_benchmark.py
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from document_store import AnnIndex, quantize, score_matrix, top_k_indices
+
+def synthetic_corpus(n, dim, clusters=200, seed=0):
+    """Unit vectors scattered around random topic centroids, like chunk embeddings"""
+    rng = np.random.default_rng(seed)
+    centroids = rng.standard_normal((clusters, dim)).astype(np.float32)
+    assignment = rng.integers(0, clusters, n)
+    vectors = centroids[assignment] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def synthetic_queries(corpus, count, seed=1):
+    """Perturbed corpus rows, so every query has close true neighbours"""
+    rng = np.random.default_rng(seed)
+    picks = corpus[rng.integers(0, len(corpus), count)]
+    queries = picks + 0.3 * rng.standard_normal(picks.shape).astype(np.float32) / np.sqrt(corpus.shape[1])
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+def exact_top_k(matrix, queries, k):
+    scores = score_matrix(matrix, queries.T)
+    return [set(top_k_indices(scores[:, column], k).tolist()) for column in range(len(queries))]
+
+def run(sizes, dim, k, query_count):
+    print(f"📊 dim={dim}, k={k}, {query_count} queries")
+    print(f"{'chunks':>9} {'dtype':>8} {'MB':>7} {'exact ms/q':>11} {'hnsw build s':>13} {'hnsw ms/q':>10} {'recall@k':>9}")
+
+    for n in sizes:
+        corpus = synthetic_corpus(n, dim)
+        queries = synthetic_queries(corpus, query_count)
+        truth = exact_top_k(corpus, queries, k)
+
+        for dtype_name in ("float16", "int8"):
+            matrix = quantize(corpus, dtype_name)
+
+            started = time.perf_counter()
+            exact = exact_top_k(matrix, queries, k)
+            exact_ms = (time.perf_counter() - started) * 1000 / query_count
+            exact_recall = np.mean([len(a & b) / k for a, b in zip(exact, truth)])
+
+            try:
+                ann = AnnIndex(dim, dtype_name)
+            except ImportError:
+                print(f"{n:>9,} {dtype_name:>8} {matrix.nbytes / 1e6:>7.1f} {exact_ms:>11.2f} {'faiss missing':>13}")
+                continue
+
+            started = time.perf_counter()
+            ann.sync(matrix)
+            build_s = time.perf_counter() - started
+
+            started = time.perf_counter()
+            _, ids = ann.search(queries, k)
+            ann_ms = (time.perf_counter() - started) * 1000 / query_count
+            ann_recall = np.mean([len(set(row.tolist()) & t) / k for row, t in zip(ids, truth)])
+
+            print(f"{n:>9,} {dtype_name:>8} {matrix.nbytes / 1e6:>7.1f} {exact_ms:>11.2f} "
+                  f"{build_s:>13.1f} {ann_ms:>10.3f} {ann_recall:>9.3f}"
+                  + (f"  (exact {dtype_name} recall {exact_recall:.3f})" if exact_recall < 1 else ""))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Document index recall/latency benchmark")
+    parser.add_argument("--sizes", default="10000,50000,200000", help="Comma-separated corpus sizes")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    print("🚀 Starting document index benchmark...")
+    run([int(s) for s in args.sizes.split(",")], args.dim, args.k, args.queries)
+    print("🎉 Benchmark completed!")
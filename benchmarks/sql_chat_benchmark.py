@@ -0,0 +1,242 @@
+# sql_chat_benchmark.py
+# Per-stage latency, execution accuracy and prompt tokens of the SQL chat
+# pipeline on assets/Chinook.db, with deltas against the previous run.
+# Run: python benchmarks/sql_chat_benchmark.py [--model ollama:llama3.1] [--fail-on-regression]
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+
+# Add parent directory to path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+# Keep benchmark questions out of the app's few-shot example store
+os.environ.setdefault("SQL_EXAMPLES_PATH", os.path.join(tempfile.mkdtemp(prefix="sql-bench-"), "examples.db"))
+
+from sql_cache import clear_caches
+from sql_database import load_schema, run_query, summarize_result
+from sql_pipeline import explanation_prompt, prepare_sql_query
+from sql_profiler import get_profile
+
+DB_PATH = os.path.join(ROOT, "assets", "Chinook.db")
+QUESTIONS_PATH = os.path.join(ROOT, "benchmarks", "chinook_sql_questions.json")
+STAGES = ("schema", "generation", "validation", "execution", "explanation")
+COMPARE_MAX_ROWS = 100000
+
+# ==================== MODELS ====================
+def count_tokens(text):
+    """cl100k token count when tiktoken (and its encoding) is available, else ~4 chars per token"""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    return len(_encoding.encode(text)) if _encoding else max(1, len(text) // 4)
+
+_encoding = None
+
+class StubLLM:
+    """Deterministic model: answers each benchmark question with its reference SQL"""
+    def __init__(self, questions):
+        self.answers = {q["question"]: q["sql"] for q in questions}
+
+    def invoke(self, prompt):
+        if prompt.startswith("The user asked"):
+            return "These rows answer the question."
+        question = prompt.rsplit("Question:", 1)[-1].split("\n", 1)[0].strip()
+        return f"```sql\n{self.answers.get(question, 'SELECT 1')}\n```"
+
+class RecordingLLM:
+    """Counts calls and prompt tokens of the wrapped model"""
+    def __init__(self, llm):
+        self.llm = llm
+        self.calls = 0
+        self.tokens = 0
+
+    def invoke(self, prompt):
+        from llm_providers import invoke_llm
+
+        self.calls += 1
+        self.tokens += count_tokens(prompt)
+        return invoke_llm(self.llm, prompt)
+
+def create_model(spec, questions):
+    if spec == "stub":
+        return StubLLM(questions)
+    if spec.startswith("ollama:"):
+        from llm_providers import create_ollama_llm
+        llm = create_ollama_llm(spec.split(":", 1)[1], temperature=0.0)
+        if llm is None:
+            sys.exit(f"❌ Could not create {spec}")
+        return llm
+    sys.exit(f"❌ Unknown model {spec!r} (use stub or ollama:<model>)")
+
+# ==================== EQUIVALENCE ====================
+def _normalized(rows, ordered):
+    """Rows with floats rounded and values sorted within each row (column order and names are ignored)"""
+    normalized = [
+        tuple(sorted((round(v, 2) if isinstance(v, float) else v for v in row), key=repr))
+        for row in rows
+    ]
+    return normalized if ordered else sorted(normalized, key=repr)
+
+def equivalent(generated_rows, reference_sql):
+    reference = run_query(DB_PATH, reference_sql, max_rows=COMPARE_MAX_ROWS, max_bytes=1 << 30)
+    ordered = re.search(r"\bORDER\s+BY\b", reference_sql, re.IGNORECASE) is not None
+    return _normalized(generated_rows, ordered) == _normalized(reference.rows, ordered)
+
+# ==================== RUN ====================
+def run_question(llm, question, schema, explain):
+    timings = {}
+    calls, tokens = llm.calls, llm.tokens
+    check, _ = prepare_sql_query(llm, question["question"], schema, DB_PATH, timings=timings)
+    record = {"id": question["id"], "verdict": check.verdict, "sql": check.sql, "correct": False, "error": None}
+
+    if not check.ok:
+        record["error"] = check.reason
+    else:
+        started = time.perf_counter()
+        result = run_query(DB_PATH, check.sql, max_rows=COMPARE_MAX_ROWS, max_bytes=1 << 30)
+        timings["execution"] = time.perf_counter() - started
+        if isinstance(result, str):
+            record["error"] = result
+        else:
+            started = time.perf_counter()
+            if explain == "llm":
+                llm.invoke(explanation_prompt(question["question"], result))
+            else:
+                summarize_result(result)
+            timings["explanation"] = time.perf_counter() - started
+            record["correct"] = equivalent(result.rows, question["sql"])
+
+    record["ms"] = {stage: round(seconds * 1000, 3) for stage, seconds in timings.items()}
+    record["calls"] = llm.calls - calls
+    record["tokens"] = llm.tokens - tokens
+    return record
+
+def wait_for_profile(schema, timeout_s=60):
+    """Profile hints change the prompt, so every question should see the finished profile"""
+    deadline = time.monotonic() + timeout_s
+    while get_profile(DB_PATH, schema) is None and time.monotonic() < deadline:
+        time.sleep(0.1)
+
+def run(model_spec, repeat, explain, warm):
+    with open(QUESTIONS_PATH) as f:
+        questions = json.load(f)
+    schema = load_schema(DB_PATH)
+    if not isinstance(schema, dict):
+        sys.exit(f"❌ {schema}")
+    wait_for_profile(schema)
+
+    llm = RecordingLLM(create_model(model_spec, questions))
+    runs = {q["id"]: [] for q in questions}
+    for _ in range(repeat):
+        for question in questions:
+            if not warm:
+                clear_caches()
+            runs[question["id"]].append(run_question(llm, question, schema, explain))
+
+    results = []
+    for question in questions:
+        records = runs[question["id"]]
+        stages = {
+            stage: statistics.median([r["ms"].get(stage, 0.0) for r in records])
+            for stage in STAGES
+        }
+        results.append({
+            "id": question["id"],
+            "correct": all(r["correct"] for r in records),
+            "verdict": records[-1]["verdict"],
+            "error": records[-1]["error"],
+            "ms": {**stages, "total": sum(stages.values())},
+            "tokens": records[-1]["tokens"],
+            "calls": records[-1]["calls"]
+        })
+
+    return {
+        "model": model_spec,
+        "explain": explain,
+        "warm": warm,
+        "repeat": repeat,
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "accuracy": sum(r["correct"] for r in results) / len(results),
+        "tokens": sum(r["tokens"] for r in results),
+        "ms": {stage: statistics.median([r["ms"][stage] for r in results]) for stage in STAGES + ("total",)},
+        "questions": results
+    }
+
+# ==================== REPORT ====================
+def _delta(current, previous):
+    if not previous:
+        return ""
+    return f" ({(current - previous) / previous:+.0%})"
+
+def print_report(report, baseline=None):
+    print(f"{'question':<22} {'ok':>3} {'verdict':>8} {'tokens':>7} " + " ".join(f"{s[:10]:>10}" for s in STAGES + ("total",)))
+    for result in report["questions"]:
+        print(f"{result['id']:<22} {'✅' if result['correct'] else '❌':>2} {result['verdict']:>8} {result['tokens']:>7,} "
+              + " ".join(f"{result['ms'][s]:>10.2f}" for s in STAGES + ("total",)))
+        if result["error"]:
+            print(f"{'':<22} ⚠️ {result['error'][:100]}")
+
+    previous = baseline or {}
+    print(f"\n📊 {report['model']}: accuracy {report['accuracy']:.0%}"
+          + (f" (was {previous['accuracy']:.0%})" if baseline else "")
+          + f", {report['tokens']:,} prompt tokens{_delta(report['tokens'], previous.get('tokens'))}")
+    for stage in STAGES + ("total",):
+        print(f"   median {stage:<12} {report['ms'][stage]:>9.2f} ms{_delta(report['ms'][stage], previous.get('ms', {}).get(stage))}")
+
+def regressions(report, baseline, tolerance):
+    """Questions that stopped being answered correctly, and a slower median total beyond tolerance"""
+    if not baseline:
+        return []
+    was_correct = {r["id"]: r["correct"] for r in baseline["questions"]}
+    problems = [f"{r['id']} is no longer correct" for r in report["questions"] if was_correct.get(r["id"]) and not r["correct"]]
+    previous_total = baseline["ms"]["total"]
+    if previous_total and report["ms"]["total"] > previous_total * (1 + tolerance):
+        problems.append(f"median total {report['ms']['total']:.2f} ms vs {previous_total:.2f} ms")
+    return problems
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SQL chat pipeline benchmark on Chinook")
+    parser.add_argument("--model", default="stub", help="stub (reference SQL, no LLM latency) or ollama:<model>")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per question; stage times are medians")
+    parser.add_argument("--explain", choices=["summary", "llm"], default="summary")
+    parser.add_argument("--warm", action="store_true", help="Keep SQL/result caches between runs")
+    parser.add_argument("--report", help="Report JSON (default tmp/sql_chat_benchmark_<model>.json); "
+                                         "an existing report is the baseline for deltas")
+    parser.add_argument("--baseline", help="Compare against this report instead")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed median total slowdown")
+    args = parser.parse_args()
+
+    slug = re.sub(r"[^\w.-]+", "_", args.model)
+    report_path = args.report or os.path.join(ROOT, "tmp", f"sql_chat_benchmark_{slug}.json")
+    baseline_path = args.baseline or report_path
+    baseline = None
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+
+    print("🚀 Starting SQL chat benchmark...")
+    report = run(args.model, args.repeat, args.explain, args.warm)
+    print_report(report, baseline)
+
+    os.makedirs(os.path.dirname(report_path), exist_ok=True)
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Report saved to {report_path}")
+
+    problems = regressions(report, baseline, args.tolerance)
+    for problem in problems:
+        print(f"❌ Regression: {problem}")
+    if problems and args.fail_on_regression:
+        sys.exit(1)
+    print("🎉 Benchmark completed!")
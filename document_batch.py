@@ -0,0 +1,133 @@
+import io
+import csv
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# ==================== CONFIGURATION ====================
+MAX_BATCH_QUESTIONS = 500
+DEFAULT_CONCURRENCY = 4
+QUESTION_COLUMNS = ("question", "questions", "query", "prompt")
+
+# ==================== QUESTION PARSING ====================
+def parse_questions(filename: str, data: bytes) -> List[str]:
+    """Read questions from a CSV (question column or first column) or JSONL file"""
+    text = data.decode("utf-8-sig", errors="replace")
+    questions = []
+
+    if filename.lower().endswith((".jsonl", ".ndjson")):
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                questions.append(item)
+            elif isinstance(item, dict):
+                key = next((k for k in item if k.lower() in QUESTION_COLUMNS), None)
+                if key:
+                    questions.append(str(item[key]))
+    else:
+        rows = list(csv.reader(io.StringIO(text)))
+        if rows:
+            header = [h.strip().lower() for h in rows[0]]
+            column = next((header.index(c) for c in QUESTION_COLUMNS if c in header), None)
+            if column is None:
+                column, body = 0, rows
+            else:
+                body = rows[1:]
+            questions = [row[column] for row in body if len(row) > column]
+
+    questions = [q.strip() for q in questions if q and q.strip()]
+    return questions[:MAX_BATCH_QUESTIONS]
+
+# ==================== RATE LIMITING ====================
+class RateLimiter:
+    """Thread-safe limiter spacing calls evenly to stay under a requests-per-minute limit"""
+    def __init__(self, requests_per_minute: Optional[float]):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+# ==================== BATCH RUNNER ====================
+def run_batch(llm, questions: List[str], document_index, build_prompt: Callable[[str, List[Dict]], str],
+              top_k: int = 3, concurrency: int = DEFAULT_CONCURRENCY,
+              requests_per_minute: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Answer many questions against one document index.
+
+    Retrieval for every question runs as a single vectorized pass; LLM calls are
+    then dispatched on a thread pool under the concurrency and rate limits.
+    Rows are yielded as each answer completes so callers can stream progress.
+    """
+    from llm_providers import invoke_llm
+
+    if document_index is not None and len(document_index):
+        all_results = document_index.search_many(questions, top_k=top_k)
+    else:
+        all_results = [[] for _ in questions]
+
+    limiter = RateLimiter(requests_per_minute)
+
+    def answer(position: int) -> Dict[str, Any]:
+        question = questions[position]
+        search_results = all_results[position]
+        limiter.acquire()
+        started = time.perf_counter()
+        try:
+            response = invoke_llm(llm, build_prompt(question, search_results))
+        except Exception as e:
+            response = f"❌ Error: {str(e)[:100]}"
+        return {
+            "index": position,
+            "question": question,
+            "answer": response,
+            "status": "error" if response.startswith(("❌", "⚠️")) else "ok",
+            "sources": "; ".join(dict.fromkeys(r["name"] for r in search_results)),
+            "chunk_ids": ",".join(str(r["chunk_id"]) for r in search_results),
+            "cited_chunks": json.dumps([r["context"][:300] for r in search_results], ensure_ascii=False),
+            "latency_s": round(time.perf_counter() - started, 3)
+        }
+
+    pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="batch-qa")
+    try:
+        futures = [pool.submit(answer, i) for i in range(len(questions))]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # A caller that stops early (rerun, Stop) must not wait for, or pay for,
+        # the queued questions; calls already in flight finish in the background
+        pool.shutdown(wait=False, cancel_futures=True)
+
+# ==================== EXPORT ====================
+def results_to_frame(rows: List[Dict[str, Any]]):
+    import pandas as pd
+    return pd.DataFrame(sorted(rows, key=lambda r: r["index"])).drop(columns=["index"])
+
+def export_csv(rows: List[Dict[str, Any]]) -> bytes:
+    return results_to_frame(rows).to_csv(index=False).encode("utf-8")
+
+def export_parquet(rows: List[Dict[str, Any]]) -> Optional[bytes]:
+    """Parquet bytes, or None if no Parquet engine is installed"""
+    buffer = io.BytesIO()
+    try:
+        results_to_frame(rows).to_parquet(buffer, index=False)
+    except ImportError as e:
+        logger.warning(f"Parquet export unavailable: {e}")
+        return None
+    return buffer.getvalue()
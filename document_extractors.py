@@ -0,0 +1,204 @@
+import io
+import codecs
+import zipfile
+import logging
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional
+from xml.etree.ElementTree import iterparse
+
+from document_store import PAGE_BREAK
+
+logger = logging.getLogger(__name__)
+
+# ==================== CONFIGURATION ====================
+READ_BLOCK_BYTES = 64 * 1024
+MAX_XLSX_COLUMNS = 200
+
+# An extractor reads a binary file object and yields text pieces (pages,
+# paragraphs, rows) in document order; PAGE_BREAK separates pages/sheets.
+Extractor = Callable[[BinaryIO], Iterator[str]]
+
+# ==================== REGISTRY ====================
+EXTRACTORS: Dict[str, Extractor] = {}
+EXTENSION_TYPES: Dict[str, str] = {}
+
+def register_extractor(mime_type: str, extensions: List[str]):
+    """Register an extractor for a MIME type and the file extensions that imply it"""
+    def decorator(func: Extractor) -> Extractor:
+        EXTRACTORS[mime_type] = func
+        for extension in extensions:
+            EXTENSION_TYPES[extension.lower()] = mime_type
+        return func
+    return decorator
+
+def resolve_mime_type(name: str, mime_type: Optional[str] = None) -> Optional[str]:
+    """Registered MIME type for an upload: the browser's type if known, else by extension"""
+    if mime_type in EXTRACTORS:
+        return mime_type
+    return EXTENSION_TYPES.get(Path(name).suffix.lower().lstrip("."))
+
+def supported_extensions() -> List[str]:
+    return sorted(EXTENSION_TYPES)
+
+def stream_text(name: str, data: bytes, mime_type: Optional[str] = None) -> Iterator[str]:
+    """Yield the text of an uploaded file piece by piece; raises ValueError for unsupported types"""
+    resolved = resolve_mime_type(name, mime_type)
+    if resolved is None:
+        raise ValueError(f"Unsupported file type: {name}")
+    return EXTRACTORS[resolved](io.BytesIO(data))
+
+# ==================== TEXT ====================
+def _is_utf8(stream: BinaryIO) -> bool:
+    """Validate the whole stream as UTF-8 block by block, then rewind it"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        while True:
+            block = stream.read(READ_BLOCK_BYTES)
+            decoder.decode(block, final=not block)
+            if not block:
+                return True
+    except UnicodeDecodeError:
+        return False
+    finally:
+        stream.seek(0)
+
+@register_extractor("text/plain", ["txt", "md", "markdown"])
+def extract_plain_text(stream: BinaryIO) -> Iterator[str]:
+    """Decode in blocks as UTF-8, or as Latin-1 when any of the file is not valid UTF-8"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig" if _is_utf8(stream) else "latin-1")()
+    while True:
+        block = stream.read(READ_BLOCK_BYTES)
+        text = decoder.decode(block, final=not block)
+        if text:
+            yield text
+        if not block:
+            break
+
+# ==================== PDF ====================
+@register_extractor("application/pdf", ["pdf"])
+def extract_pdf(stream: BinaryIO) -> Iterator[str]:
+    """Page by page with pdfplumber (layout-aware), falling back to PyPDF2"""
+    try:
+        import pdfplumber
+    except ImportError:
+        pdfplumber = None
+
+    if pdfplumber is not None:
+        with pdfplumber.open(stream) as pdf:
+            for number, page in enumerate(pdf.pages):
+                if number:
+                    yield PAGE_BREAK
+                yield page.extract_text() or ""
+                # Drop the page's parsed objects so memory stays flat across pages
+                page.close()
+        return
+
+    from PyPDF2 import PdfReader
+    for number, page in enumerate(PdfReader(stream).pages):
+        if number:
+            yield PAGE_BREAK
+        yield page.extract_text() or ""
+
+# ==================== DOCX ====================
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+@register_extractor("application/vnd.openxmlformats-officedocument.wordprocessingml.document", ["docx"])
+def extract_docx(stream: BinaryIO) -> Iterator[str]:
+    """Paragraphs (including table cells) from word/document.xml, parsed incrementally"""
+    with zipfile.ZipFile(stream) as archive, archive.open("word/document.xml") as xml:
+        body = None
+        parts: List[str] = []
+        for event, element in iterparse(xml, events=("start", "end")):
+            tag = element.tag
+            if event == "start":
+                if tag == f"{_W}body":
+                    body = element
+                continue
+            if tag == f"{_W}t":
+                parts.append(element.text or "")
+            elif tag == f"{_W}tab" and element.get(f"{_W}val") is None:
+                # Tab stops in paragraph properties carry w:val; only run tabs are text
+                parts.append("\t")
+            elif tag in (f"{_W}br", f"{_W}cr"):
+                parts.append(PAGE_BREAK if element.get(f"{_W}type") == "page" else "\n")
+            elif tag == f"{_W}p":
+                parts.append("\n")
+                yield "".join(parts)
+                parts = []
+                # Detach finished content so the tree never holds the whole document
+                element.clear()
+                if body is not None:
+                    body.clear()
+        if parts:
+            yield "".join(parts)
+
+# ==================== XLSX ====================
+@register_extractor("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", ["xlsx"])
+def extract_xlsx(stream: BinaryIO) -> Iterator[str]:
+    """Rows as tab-separated lines, one page per sheet, read in openpyxl's streaming mode"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        for number, sheet in enumerate(workbook.worksheets):
+            if number:
+                yield PAGE_BREAK
+            yield f"Sheet: {sheet.title}\n"
+            for row in sheet.iter_rows(values_only=True, max_col=MAX_XLSX_COLUMNS):
+                cells = ["" if value is None else str(value) for value in row]
+                while cells and not cells[-1]:
+                    cells.pop()
+                if cells:
+                    yield "\t".join(cells) + "\n"
+    finally:
+        workbook.close()
+
+# ==================== HTML ====================
+class _TextParser(HTMLParser):
+    """Collects visible text, skipping scripts and styles and breaking lines at block elements"""
+    SKIP = {"script", "style", "noscript", "template", "svg"}
+    BLOCKS = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6",
+              "section", "article", "header", "footer", "table", "pre", "blockquote"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skip_depth += 1
+        elif tag in self.BLOCKS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in self.BLOCKS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data)
+
+    def drain(self) -> str:
+        text = "".join(self.parts)
+        self.parts = []
+        return text
+
+@register_extractor("text/html", ["html", "htm"])
+def extract_html(stream: BinaryIO) -> Iterator[str]:
+    """Visible text, fed to the parser block by block"""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    parser = _TextParser()
+    while True:
+        block = stream.read(READ_BLOCK_BYTES)
+        parser.feed(decoder.decode(block, final=not block))
+        if not block:
+            parser.close()
+        text = parser.drain()
+        if text.strip():
+            yield text
+        if not block:
+            break
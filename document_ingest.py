@@ -0,0 +1,81 @@
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (name, mime type, raw bytes) — bytes are read on the script thread so the
+# worker never touches Streamlit's UploadedFile objects
+UploadedBlob = Tuple[str, str, bytes]
+
+# ==================== BACKGROUND INDEXING ====================
+class IndexingJob:
+    """
+    Extract and index uploaded files on a background thread.
+
+    The target index is searchable throughout; `documents` and `progress()`
+    publish what has been indexed so far for the UI to poll.
+    """
+    def __init__(self, files: List[UploadedBlob], document_index,
+                 extract: Callable[[str, bytes, Optional[str]], Iterable[str]]):
+        self.files = files
+        self.index = document_index
+        self.extract = extract
+        self.documents: List[Dict[str, Any]] = []
+        self.current: Optional[str] = None
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="document-indexer")
+
+    def start(self) -> "IndexingJob":
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        """Stop after the current file"""
+        self._cancelled.set()
+
+    @property
+    def complete(self) -> bool:
+        return self.finished_at is not None
+
+    def _run(self):
+        try:
+            for name, mime_type, data in self.files:
+                if self._cancelled.is_set():
+                    break
+                self.current = name
+                # Text is streamed from the extractor straight into the index
+                size = 0
+                try:
+                    chunks = self.index.add_stream(name, self.extract(name, data, mime_type), mime_type)
+                    size = self.index.documents[-1]["size"] if chunks else 0
+                except Exception as e:
+                    logger.warning(f"Indexing {name} failed: {e}")
+                    chunks = 0
+
+                if chunks:
+                    self.documents.append({"name": name, "size": size, "type": mime_type})
+                else:
+                    self.documents.append({"name": name, "size": 0, "type": "Error"})
+        except Exception as e:
+            self.error = str(e)
+            logger.exception("Indexing job failed")
+        finally:
+            self.current = None
+            self.finished_at = time.time()
+
+    def progress(self) -> Dict[str, Any]:
+        """Snapshot of the job state for display"""
+        return {
+            "files_done": len(self.documents),
+            "files_total": len(self.files),
+            "chunks": len(self.index),
+            "current": self.current,
+            "complete": self.complete,
+            "error": self.error,
+            "elapsed": (self.finished_at or time.time()) - self.started_at
+        }
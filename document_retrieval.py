@@ -0,0 +1,250 @@
+import time
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# ==================== CONFIGURATION ====================
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+RERANK_BATCH_SIZE = 16
+RERANK_CANDIDATES = 12
+# Reranked chunks kept for the prompt; reranking should send fewer, better chunks
+RERANK_TOP_N = 3
+RERANK_BUDGET_MS = 300
+
+# ==================== CROSS-ENCODER RERANKING ====================
+_cross_encoder = None
+_cross_encoder_error: Optional[str] = None
+_cross_encoder_lock = threading.Lock()
+_cross_encoder_thread: Optional[threading.Thread] = None
+
+def _load_cross_encoder(model_name: str):
+    global _cross_encoder, _cross_encoder_error
+    try:
+        from sentence_transformers import CrossEncoder
+        model = CrossEncoder(model_name, device="cpu")
+        with _cross_encoder_lock:
+            _cross_encoder = model
+        logger.info(f"Cross-encoder {model_name} loaded")
+    except Exception as e:
+        with _cross_encoder_lock:
+            _cross_encoder_error = str(e)
+        logger.warning(f"Cross-encoder unavailable: {e}")
+
+def get_cross_encoder(model_name: str = RERANK_MODEL):
+    """
+    Return the process-wide cross-encoder, or None while it is still loading.
+    Loading happens on a background thread so the first question is never
+    blocked on a model download.
+    """
+    global _cross_encoder_thread
+    with _cross_encoder_lock:
+        if _cross_encoder is not None or _cross_encoder_error:
+            return _cross_encoder
+        if _cross_encoder_thread is None:
+            _cross_encoder_thread = threading.Thread(
+                target=_load_cross_encoder, args=(model_name,), daemon=True, name="cross-encoder-loader"
+            )
+            _cross_encoder_thread.start()
+    return None
+
+def rerank(query: str, results: List[Dict[str, Any]], top_n: int = 3,
+           budget_ms: float = RERANK_BUDGET_MS, batch_size: int = RERANK_BATCH_SIZE) -> List[Dict[str, Any]]:
+    """
+    Reorder search results with a cross-encoder and keep the best top_n.
+
+    Candidates are scored in batches. If the model is not ready, or the next
+    batch would overrun the time budget, the original retrieval order is kept.
+    """
+    if len(results) <= 1:
+        return results[:top_n]
+
+    model = get_cross_encoder()
+    if model is None:
+        return results[:top_n]
+
+    deadline = time.perf_counter() + budget_ms / 1000.0
+    scores: List[float] = []
+    batch_seconds = 0.0
+
+    for start in range(0, len(results), batch_size):
+        now = time.perf_counter()
+        if now + batch_seconds > deadline:
+            logger.info(f"Rerank budget of {budget_ms:.0f} ms exceeded after {len(scores)} candidates; keeping retrieval order")
+            return results[:top_n]
+
+        batch = results[start:start + batch_size]
+        try:
+            batch_scores = model.predict([(query, r["context"]) for r in batch], batch_size=batch_size, show_progress_bar=False)
+        except Exception as e:
+            logger.warning(f"Rerank failed: {e}")
+            return results[:top_n]
+        scores.extend(float(s) for s in batch_scores)
+        batch_seconds = time.perf_counter() - now
+
+    if time.perf_counter() > deadline:
+        return results[:top_n]
+
+    order = sorted(range(len(results)), key=lambda i: scores[i], reverse=True)
+    return [dict(results[i], rerank_score=scores[i]) for i in order[:top_n]]
+
+# ==================== CONTEXT PACKING ====================
+# At most the old fixed context (3 excerpts of 1,000 characters, ~750 tokens)
+DEFAULT_CONTEXT_TOKENS = 750
+MAX_CONTEXT_TOKENS = 750
+MAX_EXCERPTS = 4
+MIN_PIECE_TOKENS = 80
+MMR_LAMBDA = 0.7
+# Excerpts at least this similar (cosine) to an already chosen one are dropped
+MAX_REDUNDANCY = 0.85
+
+# Context windows (tokens) of the models offered in the sidebar
+MODEL_CONTEXT_WINDOWS = {
+    "openai/gpt-oss-120b": 131072,
+    "openai/gpt-oss-20b": 131072,
+    "meta-llama/llama-4-maverick-17b-128e-instruct": 131072,
+    "mixtral-8x7b-32768": 32768,
+    "gemma2-9b-it": 8192,
+    "gpt-3.5-turbo": 16385,
+    "gpt-4": 8192,
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "gemini-pro": 32760,
+    "gemini-1.5-pro": 1048576,
+    "claude-3-haiku": 200000,
+    "claude-3-opus": 200000,
+    "claude-3-sonnet": 200000,
+    "llama3.1:8b": 8192,
+    "llama3": 8192,
+    "mistral": 8192,
+    "codellama": 16384,
+    "phi3": 4096,
+    "tinyllama": 2048
+}
+
+_token_encoder = None
+
+def count_tokens(text: str) -> int:
+    """Token count with tiktoken's cl100k_base, or a 4-characters-per-token estimate"""
+    global _token_encoder
+    if _token_encoder is None:
+        try:
+            import tiktoken
+            _token_encoder = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _token_encoder = False
+    if _token_encoder:
+        return len(_token_encoder.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if count_tokens(text) <= max_tokens:
+        return text
+    if _token_encoder:
+        return _token_encoder.decode(_token_encoder.encode(text, disallowed_special=())[:max_tokens])
+    return text[:max_tokens * 4]
+
+def context_token_budget(model: Optional[str]) -> int:
+    """Context tokens to spend on excerpts: a quarter of the model's window, capped"""
+    window = MODEL_CONTEXT_WINDOWS.get(model or "")
+    if not window:
+        return DEFAULT_CONTEXT_TOKENS
+    return min(MAX_CONTEXT_TOKENS, window // 4)
+
+def merge_overlapping(results: List[Dict[str, Any]], document_index) -> List[Dict[str, Any]]:
+    """Merge results whose chunk spans overlap or touch within the same document"""
+    by_doc: Dict[int, List[Dict[str, Any]]] = {}
+    for result in results:
+        start, end = document_index.chunk_span(result["chunk_id"])
+        by_doc.setdefault(result["doc_id"], []).append(dict(result, span=(start, end), chunk_ids=[result["chunk_id"]]))
+
+    merged = []
+    for pieces in by_doc.values():
+        pieces.sort(key=lambda r: r["span"])
+        current = pieces[0]
+        for piece in pieces[1:]:
+            cur_start, cur_end = current["span"]
+            start, end = piece["span"]
+            if start <= cur_end:
+                if end > cur_end:
+                    current["context"] += piece["context"][cur_end - start:]
+                    current["span"] = (cur_start, end)
+                current["chunk_ids"].append(piece["chunk_id"])
+                current["relevance"] = max(current["relevance"], piece["relevance"])
+                if "rerank_score" in piece:
+                    current["rerank_score"] = max(current.get("rerank_score", piece["rerank_score"]), piece["rerank_score"])
+            else:
+                merged.append(current)
+                current = piece
+        merged.append(current)
+    return merged
+
+def mmr_order(results: List[Dict[str, Any]], document_index, lambda_: float = MMR_LAMBDA,
+              max_redundancy: float = MAX_REDUNDANCY) -> List[Dict[str, Any]]:
+    """
+    Order results by maximal marginal relevance: relevance to the query minus
+    similarity to what has already been selected. Results at least
+    max_redundancy similar to a selected one are dropped as near-duplicates.
+    """
+    if len(results) <= 1:
+        return results
+
+    import numpy as np
+
+    key = "rerank_score" if all("rerank_score" in r for r in results) else "relevance"
+    relevance = np.array([r[key] for r in results], dtype=np.float32)
+    spread = relevance.max() - relevance.min()
+    relevance = (relevance - relevance.min()) / spread if spread > 0 else np.ones_like(relevance)
+
+    # Each (possibly merged) result is represented by the mean of its chunk vectors
+    matrix = document_index.embeddings
+    vectors = np.stack([np.asarray(matrix[r["chunk_ids"]], dtype=np.float32).mean(axis=0) for r in results])
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    vectors /= norms
+    similarity = vectors @ vectors.T
+
+    selected: List[int] = []
+    remaining = list(range(len(results)))
+    while remaining:
+        if selected:
+            redundancy = similarity[np.ix_(remaining, selected)].max(axis=1)
+            keep = redundancy < max_redundancy
+            remaining = [i for i, k in zip(remaining, keep) if k]
+            redundancy = redundancy[keep]
+            if not remaining:
+                break
+        else:
+            redundancy = np.zeros(len(remaining), dtype=np.float32)
+        scores = lambda_ * relevance[remaining] - (1 - lambda_) * redundancy
+        best = remaining[int(np.argmax(scores))]
+        selected.append(best)
+        remaining.remove(best)
+
+    return [results[i] for i in selected]
+
+def pack_context(results: List[Dict[str, Any]], document_index, model: Optional[str] = None,
+                 token_budget: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Choose the excerpts to send: merge overlapping spans, order by MMR
+    (dropping near-duplicates) and fill the model's token budget with at most
+    MAX_EXCERPTS excerpts, trimming the last one if it is worthwhile.
+    """
+    if not results:
+        return []
+
+    budget = token_budget or context_token_budget(model)
+    packed = []
+    for result in mmr_order(merge_overlapping(results, document_index), document_index)[:MAX_EXCERPTS]:
+        tokens = count_tokens(result["context"])
+        if tokens > budget:
+            if budget < MIN_PIECE_TOKENS:
+                break
+            result = dict(result, context=truncate_to_tokens(result["context"], budget))
+            tokens = budget
+        packed.append(dict(result, tokens=tokens))
+        budget -= tokens
+        if budget < MIN_PIECE_TOKENS:
+            break
+    return packed
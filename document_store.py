@@ -0,0 +1,881 @@
+import os
+import re
+import mmap
+import time
+import sqlite3
+import uuid
+import hashlib
+import logging
+import bisect
+import threading
+from array import array
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# ==================== CONFIGURATION ====================
+COLLECTIONS_DIR = Path(os.environ.get("DOC_COLLECTIONS_DIR", Path(__file__).parent / "tmp" / "collections"))
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+HASHING_EMBEDDER = "hashing-384"
+SCORE_BLOCK_ROWS = 8192
+EMBEDDING_DTYPE = os.environ.get("DOC_EMBEDDING_DTYPE", "float16")
+ANN_MIN_CHUNKS = int(os.environ.get("DOC_ANN_MIN_CHUNKS", "50000"))
+ANN_M = 32
+ANN_EF_CONSTRUCTION = 80
+ANN_EF_SEARCH = 64
+ANN_TRAIN_ROWS = 50000
+EMBED_BATCH_CHUNKS = 64
+STREAM_BLOCK_CHARS = 64 * 1024
+MAX_DOCUMENT_CHARS = int(os.environ.get("DOC_MAX_DOCUMENT_CHARS", "20000000"))
+FORMAT_VERSION = "2"
+PAGE_BREAK = "\f"
+
+_COLLECTION_NAME = re.compile(r"[A-Za-z0-9_\-]{1,64}")
+
+# Storage dtype -> (numpy dtype, file suffix); int8 stores round(v * 127) of unit vectors
+EMBEDDING_DTYPES = {
+    "float16": (np.float16, "f16"),
+    "int8": (np.int8, "i8")
+}
+INT8_SCALE = 1.0 / 127
+
+# ==================== CHUNKING ====================
+def chunk_spans(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[Tuple[int, int]]:
+    """Split text into overlapping (start, end) character spans, breaking on whitespace when possible"""
+    spans = []
+    length = len(text or "")
+    start = 0
+
+    while start < length:
+        end = min(length, start + chunk_size)
+        if end < length:
+            # Break at the last space in the second half of the window
+            brk = text.rfind(" ", start + chunk_size // 2, end)
+            if brk > start:
+                end = brk
+        spans.append((start, end))
+        if end >= length:
+            break
+        start = max(end - overlap, start + 1)
+
+    return spans
+
+class DocumentText:
+    """
+    Append-only document text stored as blocks and sliced by character offset.
+    Page breaks are recorded as text arrives; with retain=False only the
+    length and page breaks are kept (the text itself lives elsewhere).
+    """
+    def __init__(self, retain: bool = True):
+        self.retain = retain
+        self.length = 0
+        self.page_breaks = array("q")
+        self._blocks: List[str] = []
+        self._starts = array("q")
+
+    def __len__(self) -> int:
+        return self.length
+
+    def append(self, text: str):
+        if not text:
+            return
+        self.page_breaks.extend(self.length + match.start() for match in re.finditer(PAGE_BREAK, text))
+        if self.retain:
+            self._starts.append(self.length)
+            self._blocks.append(text)
+        self.length += len(text)
+
+    def __getitem__(self, key: slice) -> str:
+        start, end, _ = key.indices(self.length)
+        if start >= end:
+            return ""
+        block = bisect.bisect_right(self._starts, start) - 1
+        parts = []
+        while block < len(self._blocks) and self._starts[block] < end:
+            offset = self._starts[block]
+            parts.append(self._blocks[block][max(0, start - offset):end - offset])
+            block += 1
+        return "".join(parts)
+
+    def page_at(self, offset: int) -> int:
+        """1-based page of a character offset; extractors separate pages with form feeds"""
+        return bisect.bisect_right(self.page_breaks, offset) + 1
+
+    @property
+    def page_count(self) -> int:
+        return len(self.page_breaks) + 1
+
+def stream_chunks(pieces: Iterable[str], text: DocumentText,
+                  max_chars: Optional[int] = MAX_DOCUMENT_CHARS) -> Iterator[Tuple[int, int, str]]:
+    """
+    Chunk text arriving as a stream of pieces, yielding (start, end, chunk) for non-blank chunks.
+
+    Pieces are gathered into blocks of STREAM_BLOCK_CHARS and appended to text
+    before their chunks are yielded; only the unfinished last chunk is carried
+    between blocks, and the spans are the same as chunk_spans() over the whole text.
+    Reading stops after max_chars characters.
+    """
+    carry, carry_start = "", 0
+    pending: List[str] = []
+    pending_chars = 0
+    source = iter(pieces)
+    done = False
+
+    try:
+        while not done:
+            piece = next(source, None)
+            if piece is None:
+                done = True
+            elif max_chars is not None and text.length + pending_chars + len(piece) > max_chars:
+                piece = piece[:max_chars - text.length - pending_chars]
+                logger.info(f"Document truncated at {max_chars:,} characters")
+                done = True
+            if piece:
+                pending.append(piece)
+                pending_chars += len(piece)
+
+            if pending and (done or pending_chars >= STREAM_BLOCK_CHARS):
+                block = "".join(pending)
+                pending, pending_chars = [], 0
+                text.append(block)
+                window = carry + block
+            elif done:
+                window = carry
+            else:
+                continue
+
+            spans = chunk_spans(window)
+            if done or not spans:
+                resume = len(window)
+            else:
+                # The last span may grow once more text arrives; restart from it
+                resume = spans.pop()[0]
+            for start, end in spans:
+                chunk = window[start:end]
+                if chunk.strip():
+                    yield carry_start + start, carry_start + end, chunk
+            carry = window[resume:]
+            carry_start += resume
+    finally:
+        close = getattr(source, "close", None)
+        if close:
+            close()
+
+def _batches(items: Iterable, size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# ==================== EMBEDDERS ====================
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+class HashingEmbedder:
+    """Dependency-free fallback embedder (signed hashed bag of words)"""
+    def __init__(self, dim: int = 384):
+        self.name = HASHING_EMBEDDER
+        self.dim = dim
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in re.findall(r"\w+", text.lower()):
+                h = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+                out[row, h % self.dim] += 1.0 if (h >> 63) == 0 else -1.0
+        return _normalize(out)
+
+class SentenceTransformerEmbedder:
+    """CPU sentence-transformers embedder producing normalized vectors"""
+    def __init__(self, model_name: str = EMBEDDING_MODEL):
+        from sentence_transformers import SentenceTransformer
+        self.name = model_name
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        vectors = self.model.encode(
+            list(texts),
+            batch_size=64,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        return np.asarray(vectors, dtype=np.float32)
+
+_embedders: Dict[str, Any] = {}
+_embedder_lock = threading.Lock()
+
+def get_embedder(name: Optional[str] = None):
+    """
+    Return a process-wide embedder.
+    With no name, prefer sentence-transformers and fall back to hashing if it is unavailable.
+    A named embedder (e.g. the one a collection was built with) is loaded strictly.
+    """
+    requested = name or EMBEDDING_MODEL
+
+    with _embedder_lock:
+        if requested in _embedders:
+            return _embedders[requested]
+
+        if requested == HASHING_EMBEDDER:
+            embedder = HashingEmbedder()
+        else:
+            try:
+                embedder = SentenceTransformerEmbedder(requested)
+            except Exception as e:
+                if name:
+                    raise RuntimeError(f"Embedding model '{name}' unavailable: {e}")
+                logger.warning(f"sentence-transformers unavailable ({e}); using hashing embedder")
+                embedder = _embedders.setdefault(HASHING_EMBEDDER, HashingEmbedder())
+
+        _embedders[requested] = embedder
+        return embedder
+
+# ==================== QUANTIZATION ====================
+def quantize(vectors: np.ndarray, dtype_name: str) -> np.ndarray:
+    """Convert float vectors (or another stored dtype) to the given storage dtype"""
+    if dtype_name not in EMBEDDING_DTYPES:
+        raise ValueError(f"Unsupported embedding dtype '{dtype_name}'")
+    vectors = np.asarray(vectors)
+    dtype = EMBEDDING_DTYPES[dtype_name][0]
+    if vectors.dtype == dtype:
+        return vectors
+    vectors = as_float32(vectors)
+    if dtype_name == "int8":
+        return np.clip(np.rint(vectors * 127), -127, 127).astype(np.int8)
+    return vectors.astype(dtype)
+
+def as_float32(block: np.ndarray) -> np.ndarray:
+    """Dequantize stored embeddings for scoring"""
+    if block.dtype == np.int8:
+        return block.astype(np.float32) * INT8_SCALE
+    return np.asarray(block, dtype=np.float32)
+
+# ==================== SCORING ====================
+def score_matrix(matrix: np.ndarray, queries: np.ndarray) -> np.ndarray:
+    """
+    Dot-product scores in float32, converting the (possibly memory-mapped) matrix block by block.
+    queries is a single vector (dim,) or a batch laid out as (dim, n_queries).
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+    scores = np.empty((matrix.shape[0],) + queries.shape[1:], dtype=np.float32)
+    for start in range(0, matrix.shape[0], SCORE_BLOCK_ROWS):
+        block = as_float32(matrix[start:start + SCORE_BLOCK_ROWS])
+        scores[start:start + len(block)] = block @ queries
+    return scores
+
+def top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Indices of the top_k scores, best first"""
+    if len(scores) <= top_k:
+        return np.argsort(-scores)
+    candidates = np.argpartition(-scores, top_k)[:top_k]
+    return candidates[np.argsort(-scores[candidates])]
+
+# ==================== APPROXIMATE SEARCH ====================
+class AnnIndex:
+    """
+    faiss HNSW graph (scalar-quantized to match the storage dtype) over an
+    embedding matrix, extended incrementally as rows are appended.
+    """
+    def __init__(self, dim: int, dtype_name: str, index=None):
+        import faiss
+        self._faiss = faiss
+        if index is None:
+            qtype = faiss.ScalarQuantizer.QT_8bit if dtype_name == "int8" else faiss.ScalarQuantizer.QT_fp16
+            index = faiss.IndexHNSWSQ(dim, qtype, ANN_M, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = ANN_EF_CONSTRUCTION
+        index.hnsw.efSearch = ANN_EF_SEARCH
+        self.index = index
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: Path, dim: int, dtype_name: str) -> "AnnIndex":
+        import faiss
+        return cls(dim, dtype_name, index=faiss.read_index(str(path)))
+
+    def __len__(self) -> int:
+        return self.index.ntotal
+
+    def sync(self, matrix: np.ndarray):
+        """Add any rows of matrix not yet in the graph"""
+        with self._lock:
+            if not self.index.is_trained:
+                self.index.train(np.ascontiguousarray(as_float32(matrix[:ANN_TRAIN_ROWS])))
+            for start in range(self.index.ntotal, len(matrix), SCORE_BLOCK_ROWS):
+                self.index.add(np.ascontiguousarray(as_float32(matrix[start:start + SCORE_BLOCK_ROWS])))
+
+    def search(self, queries: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        with self._lock:
+            return self.index.search(np.ascontiguousarray(queries, dtype=np.float32), top_k)
+
+    def save(self, path: Path):
+        tmp = path.with_suffix(".tmp")
+        self._faiss.write_index(self.index, str(tmp))
+        os.replace(tmp, path)
+
+# ==================== IN-MEMORY INDEX ====================
+class DocumentIndex:
+    """
+    Chunked, embedded documents held in memory (one session's uploads).
+
+    Each document's text is kept once; chunks are described by compact
+    array columns (document id, page, start, end) and sliced out on demand.
+    Safe to search while a background thread is still adding documents.
+    """
+    def __init__(self, embedder=None, embedding_dtype: Optional[str] = None):
+        self.uid = uuid.uuid4().hex
+        self.embedder = embedder or get_embedder()
+        self.embedding_dtype = embedding_dtype or EMBEDDING_DTYPE
+        if self.embedding_dtype not in EMBEDDING_DTYPES:
+            raise ValueError(f"Unsupported embedding dtype '{self.embedding_dtype}'")
+        self._ann = None
+        self.documents: List[Dict[str, Any]] = []
+        self._texts: List[DocumentText] = []
+        self._chunk_doc = array("i")
+        self._chunk_page = array("i")
+        self._chunk_start = array("q")
+        self._chunk_end = array("q")
+        self._blocks: List[np.ndarray] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._chunk_end)
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        with self._lock:
+            if self._matrix is None or len(self._matrix) != len(self):
+                if self._blocks:
+                    self._matrix = np.concatenate(self._blocks)
+                    self._blocks = [self._matrix]
+                else:
+                    self._matrix = np.zeros((0, self.embedder.dim), dtype=EMBEDDING_DTYPES[self.embedding_dtype][0])
+            return self._matrix
+
+    def chunk_text(self, chunk_id: int) -> str:
+        return self._texts[self._chunk_doc[chunk_id]][self._chunk_start[chunk_id]:self._chunk_end[chunk_id]]
+
+    def chunk_document(self, chunk_id: int) -> Dict[str, Any]:
+        """Document owning a chunk"""
+        return self.documents[self.chunk_doc_id(chunk_id)]
+
+    def chunk_doc_id(self, chunk_id: int) -> int:
+        return self._chunk_doc[chunk_id]
+
+    def chunk_page(self, chunk_id: int) -> int:
+        """1-based page on which a chunk starts"""
+        return self._chunk_page[chunk_id]
+
+    def chunk_span(self, chunk_id: int) -> Tuple[int, int]:
+        """(start, end) character offsets of a chunk within its document"""
+        return self._chunk_start[chunk_id], self._chunk_end[chunk_id]
+
+    def text_range(self, doc_id: int, start: int, end: int) -> str:
+        """Exact text of a character range of a document"""
+        return self._texts[doc_id][start:end]
+
+    def add_document(self, name: str, text: str, doc_type: str = "Unknown") -> int:
+        """Chunk, embed and append a document; returns the number of chunks added"""
+        return self.add_stream(name, [text], doc_type)
+
+    def add_stream(self, name: str, pieces: Iterable[str], doc_type: str = "Unknown",
+                   max_chars: Optional[int] = MAX_DOCUMENT_CHARS) -> int:
+        """
+        Chunk, embed and append a document arriving as text pieces (pages,
+        paragraphs, rows). Chunks become searchable batch by batch, so a large
+        document is partially queryable while it is still being read.
+        """
+        text = DocumentText()
+        doc_id = None
+        added = 0
+
+        for batch in _batches(stream_chunks(pieces, text, max_chars), EMBED_BATCH_CHUNKS):
+            spans = [(start, end) for start, end, _ in batch]
+            vectors = self.embedder.encode([chunk for _, _, chunk in batch])
+            with self._lock:
+                if doc_id is None:
+                    doc_id = len(self.documents)
+                    self._texts.append(text)
+                    self.documents.append({
+                        "name": name,
+                        "type": doc_type,
+                        "size": 0,
+                        "pages": 1,
+                        "chunk_start": len(self),
+                        "chunk_end": len(self)
+                    })
+                self.documents[doc_id].update(size=text.length, pages=text.page_count)
+                self._append(doc_id, spans, [text.page_at(start) for start, _ in spans], vectors)
+            added += len(batch)
+
+        if doc_id is not None:
+            with self._lock:
+                self.documents[doc_id].update(size=text.length, pages=text.page_count)
+        return added
+
+    def _append(self, doc_id, spans, pages, vectors):
+        with self._lock:
+            self._chunk_doc.extend([doc_id] * len(spans))
+            self._chunk_page.extend(pages)
+            self._chunk_start.extend(start for start, _ in spans)
+            self._chunk_end.extend(end for _, end in spans)
+            self.documents[doc_id]["chunk_end"] += len(spans)
+            self._blocks.append(quantize(vectors, self.embedding_dtype))
+
+    def search(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+        """Return the top_k chunks by cosine similarity"""
+        if not query.strip():
+            return []
+        return self.search_many([query], top_k=top_k)[0]
+
+    def search_many(self, queries: List[str], top_k: int = 3) -> List[List[Dict[str, Any]]]:
+        """Search several queries in one pass over the embedding matrix"""
+        # Snapshot the matrix: rows appended after this point are not scored
+        matrix = self.embeddings
+        if len(matrix) == 0 or not queries:
+            return [[] for _ in queries]
+
+        query_matrix = self.embedder.encode(list(queries))
+
+        all_results = []
+        for hits in self._nearest(matrix, query_matrix, top_k):
+            results = []
+            for chunk_id, score in hits:
+                doc_id = self.chunk_doc_id(chunk_id)
+                results.append({
+                    "name": self.documents[doc_id]["name"],
+                    "context": self.chunk_text(chunk_id),
+                    "relevance": score,
+                    "chunk_id": chunk_id,
+                    "doc_id": doc_id
+                })
+            all_results.append(results)
+        return all_results
+
+    def _nearest(self, matrix: np.ndarray, query_matrix: np.ndarray, top_k: int) -> List[List[Tuple[int, float]]]:
+        """(chunk id, score) hits per query: exact dot products, or HNSW above ANN_MIN_CHUNKS"""
+        ann = self._ann_for(matrix)
+        if ann is not None:
+            scores, ids = ann.search(query_matrix, top_k)
+            return [
+                [(int(i), float(score)) for i, score in zip(row_ids, row_scores) if 0 <= i < len(matrix)]
+                for row_ids, row_scores in zip(ids, scores)
+            ]
+
+        scores = score_matrix(matrix, query_matrix.T)
+        return [
+            [(int(i), float(scores[i, column])) for i in top_k_indices(scores[:, column], top_k)]
+            for column in range(query_matrix.shape[0])
+        ]
+
+    def _ann_for(self, matrix: np.ndarray) -> Optional[AnnIndex]:
+        if len(matrix) < ANN_MIN_CHUNKS or self._ann is False:
+            return None
+        if self._ann is None:
+            try:
+                self._ann = AnnIndex(matrix.shape[1], self.embedding_dtype)
+            except ImportError as e:
+                logger.warning(f"faiss unavailable ({e}); using exact search")
+                self._ann = False
+                return None
+        self._ann.sync(matrix)
+        return self._ann
+
+    # ----- citations -----
+    def resolve_citation(self, doc_id: int, chunk_id: int, start: int, end: int) -> Dict[str, Any]:
+        """Expand a compact (doc, first chunk, start, end) citation into name, page range and text"""
+        doc = self.documents[doc_id]
+        text = self.text_range(doc_id, start, end)
+        first_page = self.chunk_page(chunk_id)
+        return {
+            "name": doc["name"],
+            "page_start": first_page,
+            "page_end": first_page + text.count(PAGE_BREAK),
+            "paged": doc.get("pages", 1) > 1,
+            "start": start,
+            "end": end,
+            "text": text
+        }
+
+# ==================== PERSISTENT COLLECTIONS ====================
+def _validate_name(name: str) -> str:
+    if not name or not _COLLECTION_NAME.fullmatch(name):
+        raise ValueError("Collection names may only contain letters, digits, '-' and '_' (max 64)")
+    return name
+
+class DocumentCollection(DocumentIndex):
+    """
+    Named on-disk collection shared by every server process.
+
+    Layout of <root>/<name>/:
+      chunks.txt       append-only UTF-8 chunk text
+      offsets.i64      end byte offset of each chunk (memory-mapped)
+      chunk_meta.i64   (document id, page, start, end) per chunk (memory-mapped)
+      embeddings.f16   row-major embedding matrix (memory-mapped; embeddings.i8 when int8)
+      ann.faiss        optional prebuilt HNSW graph for large collections
+      manifest.sqlite  metadata, documents and the committed chunk count
+
+    Writers append to the data files and then commit the new chunk count in the
+    manifest; readers only ever map the committed prefix, so a crashed or
+    in-progress writer is invisible to them.
+    """
+    def __init__(self, name: str, root: Optional[Path] = None, writable: bool = False,
+                 embedding_dtype: Optional[str] = None):
+        self.name = _validate_name(name)
+        self.uid = f"collection:{name}"
+        self.path = Path(root or COLLECTIONS_DIR) / name
+        self.writable = writable
+        self._lock = threading.Lock()
+
+        manifest = self.path / "manifest.sqlite"
+        if writable:
+            self.path.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(manifest), check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._init_manifest(embedding_dtype or EMBEDDING_DTYPE)
+        else:
+            if not manifest.exists():
+                raise FileNotFoundError(f"Collection '{name}' not found")
+            self._conn = sqlite3.connect(f"file:{manifest}?mode=ro", uri=True, check_same_thread=False, isolation_level=None)
+
+        meta = self._meta()
+        if meta.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Collection '{name}' uses storage format v{meta.get('format_version')}; re-create it")
+        self.embedder = get_embedder(meta["embedder"])
+        self.dim = int(meta["dim"])
+        self.embedding_dtype = meta["embedding_dtype"]
+        self._embeddings_file = f"embeddings.{EMBEDDING_DTYPES[self.embedding_dtype][1]}"
+        self._ann = None
+        self._ann_count = 0
+        self._count = -1
+        self.refresh()
+
+    # ----- manifest -----
+    def _init_manifest(self, embedding_dtype: str):
+        if embedding_dtype not in EMBEDDING_DTYPES:
+            raise ValueError(f"Unsupported embedding dtype '{embedding_dtype}'")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                type TEXT,
+                size INTEGER,
+                pages INTEGER,
+                chunk_start INTEGER NOT NULL,
+                chunk_end INTEGER NOT NULL,
+                added_at REAL,
+                digest TEXT
+            );
+        """)
+        # Collections made before documents had a content digest
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(documents)")}
+        if "digest" not in columns:
+            try:
+                self._conn.execute("ALTER TABLE documents ADD COLUMN digest TEXT")
+            except sqlite3.OperationalError:
+                pass  # Another writer added it first
+        if not self._conn.execute("SELECT 1 FROM meta WHERE key='embedder'").fetchone():
+            embedder = get_embedder()
+            self._conn.executemany("INSERT OR IGNORE INTO meta VALUES (?, ?)", [
+                ("format_version", FORMAT_VERSION),
+                ("embedder", embedder.name),
+                ("dim", str(embedder.dim)),
+                ("embedding_dtype", embedding_dtype),
+                ("ann_count", "0"),
+                ("chunk_count", "0"),
+                ("text_bytes", "0"),
+                ("created_at", str(time.time()))
+            ])
+
+    def _meta(self) -> Dict[str, str]:
+        return dict(self._conn.execute("SELECT key, value FROM meta").fetchall())
+
+    # ----- memory maps -----
+    def refresh(self) -> bool:
+        """Remap the data files if another process committed new chunks; returns True if changed"""
+        with self._lock:
+            meta = self._meta()
+            count = int(meta["chunk_count"])
+            if count == self._count:
+                return False
+
+            rows = self._conn.execute(
+                "SELECT name, type, size, pages, chunk_start, chunk_end FROM documents ORDER BY id"
+            ).fetchall()
+            self.documents = [
+                {"name": r[0], "type": r[1], "size": r[2], "pages": r[3], "chunk_start": r[4], "chunk_end": r[5]}
+                for r in rows
+            ]
+
+            if count:
+                self._offsets = np.memmap(self.path / "offsets.i64", dtype=np.int64, mode="r", shape=(count,))
+                self._chunk_meta = np.memmap(self.path / "chunk_meta.i64", dtype=np.int64, mode="r", shape=(count, 4))
+                self._matrix = np.memmap(
+                    self.path / self._embeddings_file,
+                    dtype=EMBEDDING_DTYPES[self.embedding_dtype][0],
+                    mode="r",
+                    shape=(count, self.dim)
+                )
+                with open(self.path / "chunks.txt", "rb") as f:
+                    self._text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._offsets = np.zeros(0, dtype=np.int64)
+                self._chunk_meta = np.zeros((0, 4), dtype=np.int64)
+                self._matrix = np.zeros((0, self.dim), dtype=EMBEDDING_DTYPES[self.embedding_dtype][0])
+                self._text = b""
+
+            # Pick up a graph rebuilt by a writer; rows beyond it are added in memory
+            ann_count = int(meta.get("ann_count", 0))
+            if ann_count != self._ann_count and (self.path / "ann.faiss").exists():
+                try:
+                    self._ann = AnnIndex.load(self.path / "ann.faiss", self.dim, self.embedding_dtype)
+                except Exception as e:
+                    logger.warning(f"Could not load ANN graph for '{self.name}': {e}")
+                    self._ann = None
+            self._ann_count = ann_count
+
+            self._count = count
+            return True
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        return self._matrix
+
+    def chunk_text(self, chunk_id: int) -> str:
+        start = int(self._offsets[chunk_id - 1]) if chunk_id else 0
+        end = int(self._offsets[chunk_id])
+        return self._text[start:end].decode("utf-8")
+
+    def chunk_doc_id(self, chunk_id: int) -> int:
+        return int(self._chunk_meta[chunk_id, 0])
+
+    def chunk_page(self, chunk_id: int) -> int:
+        return int(self._chunk_meta[chunk_id, 1])
+
+    def chunk_span(self, chunk_id: int) -> Tuple[int, int]:
+        return int(self._chunk_meta[chunk_id, 2]), int(self._chunk_meta[chunk_id, 3])
+
+    def text_range(self, doc_id: int, start: int, end: int) -> str:
+        """Stitch a document range back together from its overlapping chunks"""
+        doc = self.documents[doc_id]
+        meta = self._chunk_meta[doc["chunk_start"]:doc["chunk_end"]]
+        first = max(0, int(np.searchsorted(meta[:, 3], start, side="right")))
+        parts = []
+        covered = start
+        for chunk_id in range(doc["chunk_start"] + first, doc["chunk_end"]):
+            chunk_start, chunk_end = self.chunk_span(chunk_id)
+            if chunk_start >= end:
+                break
+            if chunk_end <= covered:
+                continue
+            text = self.chunk_text(chunk_id)
+            # Gaps between chunks held only whitespace, which was not stored
+            if chunk_start > covered:
+                parts.append(" ")
+                covered = chunk_start
+            parts.append(text[covered - chunk_start:min(end, chunk_end) - chunk_start])
+            covered = min(end, chunk_end)
+        return "".join(parts)
+
+    # ----- writing -----
+    def add_stream(self, name: str, pieces: Iterable[str], doc_type: str = "Unknown",
+                   max_chars: Optional[int] = MAX_DOCUMENT_CHARS) -> int:
+        """Chunk, embed and append a streamed document batch by batch, committed in one manifest transaction"""
+        text = DocumentText(retain=False)
+
+        def batches():
+            for batch in _batches(stream_chunks(pieces, text, max_chars), EMBED_BATCH_CHUNKS):
+                chunks = [chunk for _, _, chunk in batch]
+                yield (chunks, [(start, end) for start, end, _ in batch],
+                       [text.page_at(start) for start, _, _ in batch], self.embedder.encode(chunks))
+
+        return self._write_document(name, doc_type, batches(), lambda: (text.length, text.page_count))
+
+    def _write_document(self, name: str, doc_type: str, batches: Iterable[tuple],
+                        document_stats: Callable[[], Tuple[int, int]]) -> int:
+        """
+        Append (chunks, spans, pages, vectors) batches for one document and commit it.
+        The manifest write lock is held throughout, so other writers wait; readers
+        keep seeing the previous committed state until the final COMMIT.
+        """
+        if not self.writable:
+            raise PermissionError(f"Collection '{self.name}' is open read-only")
+        itemsize = np.dtype(EMBEDDING_DTYPES[self.embedding_dtype][0]).itemsize
+
+        # BEGIN IMMEDIATE serializes writers across processes
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            meta = self._meta()
+            count = committed = int(meta["chunk_count"])
+            digest = hashlib.sha256()
+            text_bytes = committed_bytes = int(meta["text_bytes"])
+            doc_id = self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+            with ExitStack() as stack:
+                # Drop any uncommitted tail left by a crashed writer, then append
+                files = {}
+                for filename, size in (
+                    ("chunks.txt", committed_bytes),
+                    ("offsets.i64", committed * 8),
+                    ("chunk_meta.i64", committed * 32),
+                    (self._embeddings_file, committed * self.dim * itemsize)
+                ):
+                    f = stack.enter_context(open(self.path / filename, "ab"))
+                    f.truncate(size)
+                    files[filename] = f
+
+                for chunks, spans, pages, vectors in batches:
+                    encoded = [chunk.encode("utf-8") for chunk in chunks]
+                    vectors = np.ascontiguousarray(quantize(vectors, self.embedding_dtype))
+                    if vectors.shape[1] != self.dim:
+                        raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match collection ({self.dim})")
+
+                    offsets = text_bytes + np.cumsum([len(b) for b in encoded], dtype=np.int64)
+                    chunk_meta = np.array(
+                        [(doc_id, page, start, end) for (start, end), page in zip(spans, pages)],
+                        dtype=np.int64
+                    )
+                    files["chunks.txt"].write(b"".join(encoded))
+                    digest.update(b"".join(encoded))
+                    files["offsets.i64"].write(offsets.tobytes())
+                    files["chunk_meta.i64"].write(chunk_meta.tobytes())
+                    files[self._embeddings_file].write(vectors.tobytes())
+                    count += len(chunks)
+                    text_bytes = int(offsets[-1])
+
+                for f in files.values():
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            if count == committed:
+                self._conn.execute("ROLLBACK")
+                return 0
+
+            size, page_count = document_stats()
+            self._conn.execute(
+                "INSERT INTO documents (id, name, type, size, pages, chunk_start, chunk_end, added_at, digest) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (doc_id, name, doc_type, size, page_count, committed, count, time.time(), digest.hexdigest())
+            )
+            self._conn.executemany("UPDATE meta SET value=? WHERE key=?", [
+                (str(count), "chunk_count"),
+                (str(text_bytes), "text_bytes")
+            ])
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+        self.refresh()
+        return count - committed
+
+    def build_ann(self):
+        """Build or extend the on-disk HNSW graph so readers need not build it themselves"""
+        if not self.writable:
+            raise PermissionError(f"Collection '{self.name}' is open read-only")
+        path = self.path / "ann.faiss"
+        ann = AnnIndex.load(path, self.dim, self.embedding_dtype) if path.exists() else AnnIndex(self.dim, self.embedding_dtype)
+        ann.sync(self._matrix)
+        ann.save(path)
+        self._conn.execute("UPDATE meta SET value=? WHERE key='ann_count'", (str(len(ann)),))
+        self._ann = ann
+
+    def close(self):
+        self._conn.close()
+
+def list_collections(root: Optional[Path] = None) -> List[Dict[str, Any]]:
+    """List collections on disk with their document and chunk counts"""
+    root = Path(root or COLLECTIONS_DIR)
+    collections = []
+    if not root.exists():
+        return collections
+
+    for path in sorted(root.iterdir()):
+        manifest = path / "manifest.sqlite"
+        if not manifest.exists():
+            continue
+        try:
+            conn = sqlite3.connect(f"file:{manifest}?mode=ro", uri=True)
+            try:
+                chunks = conn.execute("SELECT value FROM meta WHERE key='chunk_count'").fetchone()
+                docs = conn.execute("SELECT COUNT(*) FROM documents").fetchone()
+            finally:
+                conn.close()
+            collections.append({"name": path.name, "documents": docs[0], "chunks": int(chunks[0])})
+        except sqlite3.Error as e:
+            logger.warning(f"Skipping unreadable collection {path.name}: {e}")
+
+    return collections
+
+_open_collections: Dict[str, DocumentCollection] = {}
+_collections_lock = threading.Lock()
+
+def open_collection(name: str, root: Optional[Path] = None) -> DocumentCollection:
+    """Open a collection read-only, shared by all sessions in this process and refreshed on each call"""
+    key = str(Path(root or COLLECTIONS_DIR) / _validate_name(name))
+    with _collections_lock:
+        collection = _open_collections.get(key)
+        if collection is None:
+            collection = DocumentCollection(name, root=root)
+            _open_collections[key] = collection
+    collection.refresh()
+    return collection
+
+def _content_digest(chunks: Iterable[str]) -> str:
+    """SHA-256 of a document's chunk text, as recorded by DocumentCollection._write_document"""
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(chunk.encode("utf-8"))
+    return digest.hexdigest()
+
+def save_collection(index: DocumentIndex, name: str, root: Optional[Path] = None) -> DocumentCollection:
+    """
+    Append the documents of an in-memory index to a named collection, reusing
+    their embeddings. A document the collection already holds with the same
+    name and content is skipped, so saving the same index again adds nothing;
+    an edited document with a known name is saved.
+    """
+    writer = DocumentCollection(name, root=root, writable=True, embedding_dtype=index.embedding_dtype)
+    try:
+        if index.embedder.name != writer.embedder.name:
+            raise ValueError(f"Collection '{name}' uses {writer.embedder.name}, index uses {index.embedder.name}")
+        matrix = index.embeddings
+        saved = set(writer._conn.execute("SELECT name, digest FROM documents").fetchall())
+        for doc in index.documents:
+            chunk_ids = range(doc["chunk_start"], doc["chunk_end"])
+            key = (doc["name"], _content_digest(index.chunk_text(i) for i in chunk_ids))
+            if key in saved:
+                continue
+            saved.add(key)
+            batches = (
+                ([index.chunk_text(i) for i in ids], [index.chunk_span(i) for i in ids],
+                 [index.chunk_page(i) for i in ids], matrix[ids[0]:ids[-1] + 1])
+                for ids in _batches(range(doc["chunk_start"], doc["chunk_end"]), EMBED_BATCH_CHUNKS)
+            )
+            writer._write_document(doc["name"], doc["type"], batches,
+                                   lambda doc=doc: (doc["size"], doc.get("pages", 1)))
+        if len(writer) >= ANN_MIN_CHUNKS:
+            try:
+                writer.build_ann()
+            except ImportError as e:
+                logger.warning(f"faiss unavailable ({e}); collection will use exact search")
+    finally:
+        writer.close()
+    return open_collection(name, root=root)
@@ -22,7 +22,8 @@ class ProviderConfig:
             "api_website": "https://console.groq.com/keys",
             "default_model": "llama3-8b-8192",
             "class_name": "ChatGroq",
-            "env_var": "GROQ_API_KEY"
+            "env_var": "GROQ_API_KEY",
+            "requests_per_minute": 30
         },
         "OpenAI": {
             "package": "langchain_openai",
@@ -34,7 +35,8 @@ class ProviderConfig:
             "api_website": "https://platform.openai.com/api-keys",
             "default_model": "gpt-3.5-turbo",
             "class_name": "ChatOpenAI",
-            "env_var": "OPENAI_API_KEY"
+            "env_var": "OPENAI_API_KEY",
+            "requests_per_minute": 60
         },
         "Google Gemini": {
             "package": "langchain_google_genai",
@@ -46,7 +48,8 @@ class ProviderConfig:
             "api_website": "https://makersuite.google.com/app/apikey",
             "default_model": "gemini-pro",
             "class_name": "ChatGoogleGenerativeAI",
-            "env_var": "GOOGLE_API_KEY"
+            "env_var": "GOOGLE_API_KEY",
+            "requests_per_minute": 60
         },
         "Anthropic Claude": {
             "package": "langchain_anthropic",
@@ -58,7 +61,8 @@ class ProviderConfig:
             "api_website": "https://console.anthropic.com/",
             "default_model": "claude-3-haiku",
             "class_name": "ChatAnthropic",
-            "env_var": "ANTHROPIC_API_KEY"
+            "env_var": "ANTHROPIC_API_KEY",
+            "requests_per_minute": 50
         },
         "Ollama (Local)": {
             "package": "langchain_community",
@@ -70,7 +74,8 @@ class ProviderConfig:
             "free": True,
             "default_model": "llama3.1:8b",
             "class_name": "ChatOllama",
-            "env_var": None
+            "env_var": None,
+            "requests_per_minute": None
         }
     }
 
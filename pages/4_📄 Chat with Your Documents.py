@@ -1,7 +1,7 @@
 import streamlit as st
 import os
-import tempfile
 import sys
+import html
 from pathlib import Path
 from typing import List
 import traceback
@@ -288,112 +288,78 @@ def initialize_session():
     
     if "processed_docs" not in st.session_state:
         st.session_state.processed_docs = False
+    
+    if "document_index" not in st.session_state:
+        st.session_state.document_index = None
+    
+    if "doc_collection" not in st.session_state:
+        st.session_state.doc_collection = None
+    
+    if "indexing_job_doc" not in st.session_state:
+        st.session_state.indexing_job_doc = None
 
 # ---------- HELPER FUNCTIONS ----------
-def save_uploaded_file(uploaded_file):
-    """Save uploaded file to temporary location"""
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-        tmp.write(uploaded_file.getvalue())
-        return tmp.name
-
-def extract_text_from_pdf(file_path):
-    """Extract text from PDF file"""
-    try:
-        from PyPDF2 import PdfReader
-        reader = PdfReader(file_path)
-        text = ""
-        for page in reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
-        return text.strip()
-    except Exception as e:
-        return f"Error reading PDF: {str(e)}"
-
-def extract_text_from_txt(file_path):
-    """Extract text from TXT file"""
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return f.read()
-    except:
-        try:
-            with open(file_path, 'r', encoding='latin-1') as f:
-                return f.read()
-        except Exception as e:
-            return f"Error reading text file: {str(e)}"
-
-def process_documents(uploaded_files):
-    """Process uploaded documents"""
-    document_texts = []
+def start_indexing(uploaded_files):
+    """Index uploads on a background thread into a fresh session index"""
+    from document_store import DocumentIndex
+    from document_ingest import IndexingJob
+    from document_extractors import stream_text
     
-    for uploaded_file in uploaded_files:
-        temp_path = save_uploaded_file(uploaded_file)
-        
-        if uploaded_file.name.lower().endswith('.pdf'):
-            text = extract_text_from_pdf(temp_path)
-        elif uploaded_file.name.lower().endswith(('.txt', '.md')):
-            text = extract_text_from_txt(temp_path)
-        else:
-            text = f"[Unsupported file type: {uploaded_file.name}]"
-        
-        if text and not text.startswith("Error reading"):
-            document_texts.append({
-                "name": uploaded_file.name,
-                "text": text[:15000],  # Limit text length
-                "size": len(text),
-                "type": uploaded_file.type if hasattr(uploaded_file, 'type') else 'Unknown'
-            })
-        else:
-            document_texts.append({
-                "name": uploaded_file.name,
-                "text": f"Could not extract text from {uploaded_file.name}",
-                "size": 0,
-                "type": "Error"
-            })
-        
-        # Clean up temp file
-        try:
-            os.unlink(temp_path)
-        except:
-            pass
+    if st.session_state.indexing_job_doc:
+        st.session_state.indexing_job_doc.cancel()
     
-    return document_texts
+    files = [(f.name, getattr(f, 'type', None) or 'Unknown', f.getvalue()) for f in uploaded_files]
+    document_index = DocumentIndex()
+    st.session_state.indexing_job_doc = IndexingJob(files, document_index, stream_text).start()
+    st.session_state.document_index = document_index
+    st.session_state.document_texts = []
 
-def search_in_documents(query, document_texts, top_k=3):
-    """Simple search in documents"""
-    results = []
-    query_lower = query.lower()
+def sync_indexing_job():
+    """Publish the background job's progress into session state; returns True while it is running"""
+    job = st.session_state.indexing_job_doc
+    if job is None:
+        return False
     
-    for doc in document_texts:
-        if doc["type"] == "Error":
-            continue
-            
-        text_lower = doc["text"].lower()
-        
-        # Simple keyword matching
-        if query_lower in text_lower:
-            # Find context around match
-            pos = text_lower.find(query_lower)
-            start = max(0, pos - 200)
-            end = min(len(doc["text"]), pos + 500)
-            context = doc["text"][start:end]
-            
-            results.append({
-                "name": doc["name"],
-                "context": context,
-                "relevance": 1.0
-            })
-        elif any(word in text_lower for word in query_lower.split()[:3]):
-            # Partial match
-            results.append({
-                "name": doc["name"],
-                "context": doc["text"][:500] + "...",
-                "relevance": 0.5
-            })
+    st.session_state.document_texts = list(job.documents)
+    if job.complete:
+        st.session_state.indexing_job_doc = None
+        if job.error:
+            st.session_state.last_error_doc = f"❌ Indexing error: {job.error[:100]}"
+        return False
+    return True
+
+@st.fragment(run_every=1.0)
+def render_indexing_progress():
+    """Poll the background job every second until it finishes"""
+    if not sync_indexing_job():
+        # Full rerun so the document list and status panel pick up the final state
+        st.rerun()
     
-    # Sort by relevance
-    results.sort(key=lambda x: x["relevance"], reverse=True)
-    return results[:top_k]
+    progress = st.session_state.indexing_job_doc.progress()
+    st.progress(
+        progress["files_done"] / max(1, progress["files_total"]),
+        text=f"Indexing {progress['current'] or '...'} ({progress['files_done']}/{progress['files_total']} files)"
+    )
+    st.caption(f"⚡ {progress['chunks']:,} chunks searchable so far")
+
+def describe_documents(document_index):
+    """Document listing (name, size, type) for the sidebar and status panel"""
+    if document_index is None:
+        return []
+    return [{"name": d["name"], "size": d["size"], "type": d["type"]} for d in document_index.documents]
+
+def get_active_index():
+    """Return the shared collection if one is open, else this session's upload index"""
+    if st.session_state.doc_collection:
+        from document_store import open_collection
+        return open_collection(st.session_state.doc_collection)
+    return st.session_state.document_index
+
+def search_in_documents(query, document_index, top_k=3):
+    """Semantic search over the document index"""
+    if document_index is None or len(document_index) == 0:
+        return []
+    return document_index.search(query, top_k=top_k)
 
 def build_prompt(query, search_results):
     """Build prompt with document context"""
@@ -407,7 +373,7 @@ Please provide a helpful response based on your general knowledge:"""
         context = "Based on the following document excerpts:\n\n"
         for i, result in enumerate(search_results, 1):
             context += f"Document {i}: {result['name']}\n"
-            context += f"Excerpt: {result['context'][:1000]}\n\n"
+            context += f"Excerpt: {result['context']}\n\n"
         
         prompt = f"""The user asked: "{query}"
 
@@ -420,6 +386,110 @@ Answer:"""
     
     return prompt
 
+# ---------- DOCUMENT REFERENCES ----------
+def render_references(message, key):
+    """Resolve a message's citations to page and character ranges when toggled open"""
+    if not st.toggle("📚 Document References", value=False, key=key):
+        return
+    
+    document_index = get_active_index()
+    if document_index is None or document_index.uid != message["citation_index"]:
+        st.caption("The referenced documents are no longer loaded.")
+        return
+    
+    for i, (doc_id, chunk_id, start, end) in enumerate(message["citations"], 1):
+        ref = document_index.resolve_citation(doc_id, chunk_id, start, end)
+        location = f"chars {ref['start']:,}–{ref['end']:,}"
+        if ref["paged"]:
+            pages = f"p. {ref['page_start']}" if ref["page_start"] == ref["page_end"] else f"pp. {ref['page_start']}–{ref['page_end']}"
+            location = f"{pages}, {location}"
+        
+        st.markdown(f"""
+        <div class="doc-reference">
+            <strong style="color: var(--accent-200);">Document {i}: {html.escape(ref['name'])}</strong>
+            <small style="color: var(--text-200);"> · {location}</small><br>
+            <div style="color: var(--primary-300); margin-top: 0.5rem;">
+                {html.escape(ref['text'][:500])}...
+            </div>
+        </div>
+        """, unsafe_allow_html=True)
+
+# ---------- BATCH QUESTIONS ----------
+def render_batch_mode(llm):
+    """Answer a file of questions against the current documents"""
+    from document_batch import parse_questions, run_batch, export_csv, export_parquet, DEFAULT_CONCURRENCY
+    from document_retrieval import pack_context
+    from llm_providers import ProviderConfig
+    
+    with st.expander("📋 Batch Questions", expanded=False):
+        questions_file = st.file_uploader(
+            "Questions file",
+            type=["csv", "jsonl"],
+            help="CSV with a 'question' column (or questions in the first column), or JSONL with a 'question' field",
+            key="batch_file_doc"
+        )
+        
+        provider_info = ProviderConfig.get_provider_info(st.session_state.get("current_provider_doc") or "")
+        default_rpm = provider_info.get("requests_per_minute") or 0
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            concurrency = st.slider("Concurrent requests", 1, 16, DEFAULT_CONCURRENCY, key="batch_concurrency_doc")
+        with col2:
+            rpm = st.number_input(
+                "Requests per minute (0 = unlimited)",
+                min_value=0,
+                max_value=10000,
+                value=int(default_rpm),
+                help="Defaults to the provider's free-tier rate limit",
+                key="batch_rpm_doc"
+            )
+        
+        if questions_file:
+            try:
+                questions = parse_questions(questions_file.name, questions_file.getvalue())
+            except Exception as e:
+                st.error(f"❌ Could not read questions: {str(e)[:100]}")
+                questions = []
+            
+            st.caption(f"{len(questions)} question(s) found")
+            
+            if questions and st.button("▶️ Run Batch", use_container_width=True, type="primary"):
+                progress = st.progress(0.0, text="Retrieving context...")
+                latest = st.empty()
+                rows = []
+                
+                document_index = get_active_index()
+                model = st.session_state.get("model_doc")
+                
+                for row in run_batch(
+                    llm,
+                    questions,
+                    document_index,
+                    lambda question, results: build_prompt(question, pack_context(results, document_index, model=model)),
+                    concurrency=concurrency,
+                    requests_per_minute=rpm or None
+                ):
+                    rows.append(row)
+                    progress.progress(len(rows) / len(questions), text=f"Answered {len(rows)} of {len(questions)}")
+                    latest.caption(f"✅ {row['question'][:80]}")
+                
+                latest.empty()
+                st.session_state.batch_results_doc = rows
+        
+        rows = st.session_state.get("batch_results_doc")
+        if rows:
+            failed = sum(1 for r in rows if r["status"] != "ok")
+            st.success(f"✅ {len(rows) - failed} answered, {failed} failed")
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                st.download_button("⬇️ CSV", export_csv(rows), "batch_answers.csv", "text/csv", use_container_width=True)
+            with col2:
+                parquet = export_parquet(rows)
+                if parquet:
+                    st.download_button("⬇️ Parquet", parquet, "batch_answers.parquet", "application/octet-stream", use_container_width=True)
+
 # ---------- DISPLAY ERROR HELP ----------
 def display_error_help(error_message: str, provider: str = None):
     """Display helpful error information"""
@@ -522,6 +592,7 @@ def setup_sidebar():
             if config:
                 current_provider = config.get("provider")
                 api_key = config.get("api_key", "")
+                st.session_state.model_doc = config.get("model")
                 
                 # Check if provider changed
                 if st.session_state.current_provider_doc != current_provider:
@@ -557,29 +628,31 @@ def setup_sidebar():
         # Document upload section
         st.markdown("### 📁 Upload Documents")
         
+        from document_extractors import supported_extensions
+        
         uploaded_files = st.file_uploader(
             "Choose files",
-            type=["pdf", "txt", "md"],
+            type=supported_extensions(),
             accept_multiple_files=True,
-            help="Upload PDF or text files (PDF, TXT, MD)",
+            help="Upload PDF, Word, Excel, HTML or text files",
             key="file_uploader_doc"
         )
         
         if uploaded_files:
             # Process if files changed
             current_names = [f.name for f in uploaded_files]
-            previous_names = [f["name"] for f in st.session_state.document_texts] if st.session_state.document_texts else []
+            previous_names = st.session_state.get("uploaded_names_doc", [])
             
             if current_names != previous_names:
-                with st.spinner("Processing documents..."):
-                    document_texts = process_documents(uploaded_files)
-                    st.session_state.document_texts = document_texts
-                    st.session_state.processed_docs = True
-                    
-                    if document_texts:
-                        st.success(f"✅ Processed {len(document_texts)} document(s)")
-                    else:
-                        st.error("❌ No documents could be processed")
+                start_indexing(uploaded_files)
+                st.session_state.doc_collection = None
+                st.session_state.pop("collection_select_doc", None)
+                st.session_state.uploaded_names_doc = current_names
+                st.session_state.processed_docs = True
+        
+        # Background indexing progress
+        if sync_indexing_job():
+            render_indexing_progress()
         
         # Show uploaded files
         if st.session_state.document_texts:
@@ -592,6 +665,76 @@ def setup_sidebar():
                 </div>
                 """, unsafe_allow_html=True)
         
+        # Retrieval settings
+        st.markdown("---")
+        st.markdown("### 🎯 Retrieval")
+        
+        rerank_enabled = st.checkbox(
+            "Rerank with cross-encoder",
+            value=False,
+            help="Score more candidates with a local CPU cross-encoder and keep only the best ones",
+            key="rerank_doc"
+        )
+        if rerank_enabled:
+            st.slider(
+                "Rerank time budget (ms)",
+                min_value=50,
+                max_value=2000,
+                value=300,
+                step=50,
+                help="If reranking would take longer, the original retrieval order is used",
+                key="rerank_budget_ms_doc"
+            )
+            from document_retrieval import get_cross_encoder
+            if get_cross_encoder() is None:
+                st.caption("⏳ Cross-encoder loading; using retrieval order until ready")
+        
+        # Shared collections
+        st.markdown("---")
+        st.markdown("### 🗂️ Shared Collections")
+        
+        try:
+            from document_store import list_collections, open_collection, save_collection
+            
+            collections = list_collections()
+            options = ["(Session uploads)"] + [c["name"] for c in collections]
+            current = st.session_state.doc_collection or "(Session uploads)"
+            selected = st.selectbox(
+                "Open collection",
+                options=options,
+                index=options.index(current) if current in options else 0,
+                help="Collections are stored on disk and shared by every user of this server",
+                key="collection_select_doc"
+            )
+            
+            if selected != current:
+                if selected == "(Session uploads)":
+                    st.session_state.doc_collection = None
+                    index = st.session_state.document_index
+                    st.session_state.document_texts = describe_documents(index)
+                else:
+                    collection = open_collection(selected)
+                    st.session_state.doc_collection = selected
+                    st.session_state.document_texts = describe_documents(collection)
+                st.session_state.processed_docs = bool(st.session_state.document_texts)
+                st.rerun()
+            
+            indexing = st.session_state.indexing_job_doc is not None
+            if st.session_state.document_index and len(st.session_state.document_index) and not st.session_state.doc_collection and not indexing:
+                collection_name = st.text_input("Collection name", placeholder="team-handbook", key="collection_name_doc")
+                if st.button("💾 Save to Collection", use_container_width=True) and collection_name:
+                    with st.spinner("Saving collection..."):
+                        collection = save_collection(st.session_state.document_index, collection_name.strip())
+                    # The shared copy replaces this session's in-memory index
+                    st.session_state.doc_collection = collection.name
+                    st.session_state.pop("collection_select_doc", None)
+                    st.session_state.document_index = None
+                    st.session_state.document_texts = describe_documents(collection)
+                    st.success(f"✅ Saved to '{collection.name}' ({len(collection)} chunks)")
+                    st.rerun()
+        except Exception as e:
+            st.error(f"❌ Collection error: {str(e)[:100]}")
+        
         # Troubleshooting expander
         with st.expander("🔧 Troubleshooting", expanded=False):
             st.markdown("""
@@ -619,7 +762,13 @@ def setup_sidebar():
         
         with col2:
             if st.button("🗑️ Clear Docs", use_container_width=True, type="secondary"):
+                if st.session_state.indexing_job_doc:
+                    st.session_state.indexing_job_doc.cancel()
+                    st.session_state.indexing_job_doc = None
                 st.session_state.document_texts = []
+                st.session_state.document_index = None
+                st.session_state.doc_collection = None
+                st.session_state.pop("collection_select_doc", None)
                 st.session_state.processed_docs = False
                 st.session_state.messages_doc = [
                     {"role": "assistant", "content": "Documents cleared! Upload new files to begin. 📄"}
@@ -669,6 +818,8 @@ def main():
             </div>
         </div>
         ''', unsafe_allow_html=True)
+    elif st.session_state.indexing_job_doc:
+        st.info("⏳ Indexing documents in the background. You can already ask questions about what has been indexed.")
     elif st.session_state.document_texts:
         st.info("📄 Documents uploaded but not processed.")
     else:
@@ -679,13 +830,19 @@ def main():
         st.markdown(f'<div class="error-message">{st.session_state.last_error_doc}</div>', unsafe_allow_html=True)
         display_error_help(st.session_state.last_error_doc, current_provider)
     
+    # Batch questions
+    if llm and st.session_state.processed_docs and st.session_state.document_texts:
+        render_batch_mode(llm)
+    
     # Display chat messages
-    for message in st.session_state.messages_doc:
+    for position, message in enumerate(st.session_state.messages_doc):
         with st.chat_message(message["role"]):
             st.write(message["content"])
+            if message.get("citations"):
+                render_references(message, key=f"refs_doc_{position}")
     
     # Chat input
-    if llm and st.session_state.processed_docs and st.session_state.document_texts:
+    if llm and st.session_state.processed_docs and (st.session_state.document_texts or st.session_state.indexing_job_doc):
         user_input = st.chat_input("Ask a question about your documents...", key="chat_input")
         
         if user_input:
@@ -700,8 +857,19 @@ def main():
             with st.chat_message("assistant"):
                 with st.spinner("📖 Searching documents..."):
                     try:
-                        # Search in documents
-                        search_results = search_in_documents(user_input, st.session_state.document_texts)
+                        # Search a wider candidate pool, optionally rerank, then pack
+                        # distinct excerpts into the model's token budget
+                        from document_retrieval import rerank, pack_context, RERANK_CANDIDATES, RERANK_TOP_N
+                        document_index = get_active_index()
+                        candidates = search_in_documents(user_input, document_index, top_k=RERANK_CANDIDATES)
+                        if st.session_state.get("rerank_doc"):
+                            candidates = rerank(
+                                user_input,
+                                candidates,
+                                top_n=RERANK_TOP_N,
+                                budget_ms=st.session_state.get("rerank_budget_ms_doc", 300)
+                            )
+                        search_results = pack_context(candidates, document_index, model=st.session_state.get("model_doc"))
                         
                         # Build prompt
                         prompt = build_prompt(user_input, search_results)
@@ -710,24 +878,29 @@ def main():
                         from llm_providers import invoke_llm
                         response = invoke_llm(llm, prompt)
                         
+                        # Flag answers drawn from an index that is still being built
+                        job = st.session_state.indexing_job_doc
+                        if job and not job.complete:
+                            progress = job.progress()
+                            response += (
+                                f"\n\n⏳ *Indexing still in progress ({progress['files_done']}/{progress['files_total']} files, "
+                                f"{progress['chunks']:,} chunks) — this answer used a partial index.*"
+                            )
+                        
                         # Display response
                         st.write(response)
                         
-                        # Show references if available
+                        # Keep references as compact (doc, chunk, start, end) citations,
+                        # resolved to text only when the user opens them
+                        message = {"role": "assistant", "content": response}
                         if search_results and not (response.startswith("❌") or response.startswith("⚠️")):
-                            with st.expander("📚 Document References", expanded=False):
-                                for i, result in enumerate(search_results, 1):
-                                    st.markdown(f"""
-                                    <div class="doc-reference">
-                                        <strong style="color: var(--accent-200);">Document {i}: {result['name']}</strong><br>
-                                        <div style="color: var(--primary-300); margin-top: 0.5rem;">
-                                            {result['context'][:500]}...
-                                        </div>
-                                    </div>
-                                    """, unsafe_allow_html=True)
+                            message["citation_index"] = document_index.uid
+                            message["citations"] = [
+                                (r["doc_id"], r["chunk_ids"][0], r["span"][0], r["span"][1]) for r in search_results
+                            ]
                         
                         # Add to chat history
-                        st.session_state.messages_doc.append({"role": "assistant", "content": response})
+                        st.session_state.messages_doc.append(message)
                         
                     except Exception as e:
                         error_msg = f"❌ Error: {str(e)[:100]}"
@@ -1,13 +1,13 @@
 import streamlit as st
-import requests
 import os
 import sys
-import re
 import traceback
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from web_fetch import normalize_url
+
 # Page configuration
 st.set_page_config(
     page_title="Chat with Website",
@@ -290,71 +290,6 @@ def initialize_session():
         st.session_state.website_contents = {}
 
 # ---------- HELPER FUNCTIONS ----------
-def normalize_url(url):
-    """Normalize URL"""
-    url = url.strip()
-    if not url.startswith(('http://', 'https://')):
-        url = 'https://' + url
-    return url
-
-def fetch_website(url, max_chars=8000):
-    """Fetch website content"""
-    try:
-        url = normalize_url(url)
-        
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        
-        response = requests.get(url, headers=headers, timeout=15)
-        response.raise_for_status()
-        
-        # Extract text from HTML
-        html = response.text
-        
-        # Remove scripts and styles
-        html = re.sub(r'<script.*?</script>', '', html, flags=re.DOTALL | re.IGNORECASE)
-        html = re.sub(r'<style.*?</style>', '', html, flags=re.DOTALL | re.IGNORECASE)
-        html = re.sub(r'<!--.*?-->', '', html, flags=re.DOTALL)
-        
-        # Get text between tags
-        text = re.sub(r'<[^>]+>', ' ', html)
-        
-        # Clean up
-        text = re.sub(r'\s+', ' ', text)
-        text = text.strip()
-        
-        # Limit length
-        if len(text) > max_chars:
-            text = text[:max_chars] + "..."
-        
-        # Get title
-        title_match = re.search(r'<title>(.*?)</title>', html, re.IGNORECASE)
-        title = title_match.group(1) if title_match else "No title"
-        
-        # Clean title
-        title = title.replace('\n', ' ').strip()
-        
-        return {
-            "success": True,
-            "url": url,
-            "title": title,
-            "content": text,
-            "length": len(text),
-            "status_code": response.status_code
-        }
-        
-    except requests.exceptions.Timeout:
-        return {"success": False, "error": "Timeout (15 seconds)", "url": url}
-    except requests.exceptions.SSLError:
-        return {"success": False, "error": "SSL Error", "url": url}
-    except requests.exceptions.ConnectionError:
-        return {"success": False, "error": "Connection Failed", "url": url}
-    except requests.exceptions.RequestException as e:
-        return {"success": False, "error": f"Request Error: {str(e)[:100]}", "url": url}
-    except Exception as e:
-        return {"success": False, "error": f"Error: {str(e)[:100]}", "url": url}
-
 def build_prompt(query, website_results):
     """Build prompt with website content"""
     successful = [r for r in website_results if r.get("success", False)]
@@ -583,25 +518,36 @@ def setup_sidebar():
         if st.session_state.websites:
             st.markdown("---")
             if st.button("🚀 Fetch Websites", use_container_width=True):
-                with st.spinner("Fetching websites..."):
-                    new_content = {}
-                    for url in st.session_state.websites:
-                        if url not in st.session_state.website_contents:
-                            result = fetch_website(url)
-                            new_content[url] = result
-                        else:
-                            new_content[url] = st.session_state.website_contents[url]
-                    
-                    st.session_state.website_contents = new_content
-                    
-                    successful = sum(1 for r in st.session_state.website_contents.values() if r.get("success", False))
-                    total = len(st.session_state.websites)
-                    
-                    if successful > 0:
-                        st.success(f"✅ Fetched {successful} of {total} websites")
-                    else:
-                        st.error("❌ Failed to fetch any websites")
-                    st.rerun()
+                from web_fetch import fetch_websites
+                
+                new_content = {url: st.session_state.website_contents[url]
+                               for url in st.session_state.websites if url in st.session_state.website_contents}
+                to_fetch = [url for url in st.session_state.websites if url not in new_content]
+                
+                if to_fetch:
+                    # Fetch concurrently and list each site as it finishes
+                    progress = st.progress(0.0, text=f"Fetching {len(to_fetch)} websites...")
+                    try:
+                        for done, result in enumerate(fetch_websites(to_fetch), start=1):
+                            new_content[result["url"]] = result
+                            if result.get("success", False):
+                                st.caption(f"✅ {result['title'][:60]}")
+                            else:
+                                st.caption(f"❌ {result['url'][:50]}: {result['error']}")
+                            progress.progress(done / len(to_fetch), text=f"Fetched {done} of {len(to_fetch)} websites")
+                    except ImportError:
+                        st.error("❌ httpx package not installed. Install with: `pip install httpx`")
+                
+                st.session_state.website_contents = new_content
+                
+                successful = sum(1 for r in st.session_state.website_contents.values() if r.get("success", False))
+                total = len(st.session_state.websites)
+                
+                if successful > 0:
+                    st.success(f"✅ Fetched {successful} of {total} websites")
+                else:
+                    st.error("❌ Failed to fetch any websites")
+                st.rerun()
         
         # Troubleshooting expander
         with st.expander("🔧 Troubleshooting", expanded=False):
@@ -0,0 +1,355 @@
+import os
+import re
+import time
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from sql_database import (
+    COUNT_BUDGET_MS, FETCH_BATCH_ROWS, MAX_RESULT_BYTES, MAX_RESULT_ROWS, PROGRESS_STEPS,
+    QueryCheck, QueryGuard, QueryResult, Schema, _row_bytes, _strip_statement, arrow_table
+)
+
+logger = logging.getLogger(__name__)
+
+# ==================== CONFIGURATION ====================
+ENGINE_POOL_SIZE = int(os.environ.get("SQL_ENGINE_POOL_SIZE", "5"))
+ENGINE_MAX_OVERFLOW = 10
+ENGINE_POOL_RECYCLE_S = 1800
+# Other engines cannot be watched for changes cheaply: schemas and cached
+# results for a URL are reused for at most this long
+URL_VERSION_TTL_S = int(os.environ.get("SQL_URL_VERSION_TTL_S", "300"))
+
+# Statements that make a pooled connection's session read-only, per dialect
+READ_ONLY_SESSION = {
+    "sqlite": "PRAGMA query_only=ON",
+    "postgresql": "SET SESSION CHARACTERISTICS AS TRANSACTION READ ONLY",
+    "mysql": "SET SESSION TRANSACTION READ ONLY",
+    "mariadb": "SET SESSION TRANSACTION READ ONLY"
+}
+# Time limits that end with the statement (or, for SET LOCAL, with the rolled
+# back transaction), so none outlives it on a pooled connection
+STATEMENT_TIMEOUT = {
+    "postgresql": "SET LOCAL statement_timeout = {ms}",
+    "mysql": "SELECT /*+ MAX_EXECUTION_TIME({ms}) */",
+    "mariadb": "SET STATEMENT max_statement_time = {s} FOR {sql}"
+}
+# Dialects where "EXPLAIN <query>" compiles a query without running it
+EXPLAIN_DIALECTS = {"sqlite", "postgresql", "mysql", "mariadb", "duckdb"}
+
+DIALECT_LABELS = {
+    "sqlite": "SQLite", "postgresql": "PostgreSQL", "mysql": "MySQL", "mariadb": "MariaDB",
+    "duckdb": "DuckDB", "mssql": "SQL Server", "oracle": "Oracle", "snowflake": "Snowflake"
+}
+
+READ_STATEMENT = re.compile(r"^(SELECT|WITH|VALUES)\b", re.IGNORECASE)
+
+# ==================== SOURCES ====================
+def is_database_url(source: Optional[str]) -> bool:
+    """True for SQLAlchemy URLs (dialect[+driver]://...), False for SQLite file paths"""
+    return bool(source) and re.match(r"^[A-Za-z][\w+.-]*://", source) is not None
+
+def _strip_comments(sql: str) -> str:
+    sql = re.sub(r"/\*.*?\*/", " ", sql, flags=re.DOTALL)
+    return re.sub(r"--[^\n]*", " ", sql).strip()
+
+def read_only_problem(query: str) -> Optional[str]:
+    """Why a query is not a single read-only statement, or None if it is"""
+    sql = _strip_comments(_strip_statement(query))
+    if not READ_STATEMENT.match(sql):
+        return "only read-only SELECT queries are allowed"
+    # Semicolons inside string literals or quoted names do not separate statements
+    if ";" in re.sub(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"", "", sql):
+        return "only one statement can be run at a time"
+    return None
+
+# ==================== SQLITE FILES ====================
+class SQLiteBackend:
+    """SQLite database files, served by sql_database's pooled read-only connections"""
+    dialect = "sqlite"
+    dialect_label = "SQLite"
+
+    def __init__(self, db_path: str):
+        self.source = db_path
+
+    def schema(self) -> Union[Schema, str]:
+        from sql_database import load_schema
+        return load_schema(self.source)
+
+    def run(self, query: str, **kwargs) -> Union[QueryResult, str]:
+        from sql_database import run_query
+        return run_query(self.source, query, **kwargs)
+
+    def validate(self, query: str, **kwargs) -> QueryCheck:
+        from sql_database import validate_query
+        return validate_query(self.source, query, **kwargs)
+
+    def version(self) -> tuple:
+        from sql_database import database_version
+        return database_version(self.source)
+
+# ==================== SQLALCHEMY ENGINES ====================
+class SQLAlchemyBackend:
+    """
+    Any engine SQLAlchemy can reach by URL (PostgreSQL, MySQL, DuckDB via
+    duckdb_engine, SQLite URLs, ...). One pooled engine per URL is shared by
+    every session; sessions are made read-only per dialect where possible and
+    every query runs in a transaction that is rolled back.
+    """
+    def __init__(self, url: str):
+        from sqlalchemy import create_engine, event
+        from sqlalchemy.engine import make_url
+
+        self.source = url
+        self.url = make_url(url)
+        self.dialect = self.url.get_backend_name()
+        options: Dict[str, Any] = {"pool_pre_ping": True, "pool_recycle": ENGINE_POOL_RECYCLE_S}
+        if self.dialect == "duckdb":
+            options["connect_args"] = {"read_only": True}
+        try:
+            self.engine = create_engine(self.url, pool_size=ENGINE_POOL_SIZE, max_overflow=ENGINE_MAX_OVERFLOW, **options)
+        except TypeError:
+            # Pools without overflow (e.g. in-memory SQLite) take no size arguments
+            self.engine = create_engine(self.url, **options)
+
+        read_only = READ_ONLY_SESSION.get(self.dialect)
+        if read_only:
+            @event.listens_for(self.engine, "connect")
+            def _read_only_session(dbapi_connection, connection_record):
+                cursor = dbapi_connection.cursor()
+                try:
+                    cursor.execute(read_only)
+                finally:
+                    cursor.close()
+
+        self._schema: Optional[Tuple[tuple, Schema]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def dialect_label(self) -> str:
+        """Dialect name for generation prompts"""
+        return DIALECT_LABELS.get(self.dialect, self.dialect)
+
+    @property
+    def display_name(self) -> str:
+        return self.url.render_as_string(hide_password=True)
+
+    def version(self) -> tuple:
+        return (self.display_name, int(time.time() // URL_VERSION_TTL_S))
+
+    # ---------- Schema ----------
+    def reflect_schema(self) -> Schema:
+        """Dialect-aware reflection into the same shape as sql_database.introspect_schema"""
+        from sqlalchemy import inspect
+
+        inspector = inspect(self.engine)
+        schema: Schema = {}
+        for table in inspector.get_table_names():
+            primary_key = set(inspector.get_pk_constraint(table).get("constrained_columns") or [])
+            columns = {}
+            for col in inspector.get_columns(table):
+                try:
+                    type_name = str(col["type"])
+                except Exception:
+                    type_name = type(col["type"]).__name__
+                columns[col["name"]] = {
+                    "name": col["name"], "type": type_name, "pk": col["name"] in primary_key,
+                    "notnull": not col.get("nullable", True), "fk": None,
+                    "indexed": col["name"] in primary_key, "unique": False
+                }
+
+            for fk in inspector.get_foreign_keys(table):
+                for local, remote in zip(fk["constrained_columns"], fk["referred_columns"]):
+                    if local in columns:
+                        columns[local]["fk"] = f"{fk['referred_table']}.{remote}"
+
+            indexes = [(index["column_names"], bool(index.get("unique"))) for index in inspector.get_indexes(table)]
+            try:
+                indexes += [(constraint["column_names"], True) for constraint in inspector.get_unique_constraints(table)]
+            except NotImplementedError:
+                pass
+            for names, unique in indexes:
+                for name in names:
+                    if name in columns:
+                        columns[name]["indexed"] = True
+                        columns[name]["unique"] = columns[name]["unique"] or unique
+
+            schema[table] = list(columns.values())
+        return schema
+
+    def schema(self) -> Union[Schema, str]:
+        """Reflected schema, cached for URL_VERSION_TTL_S. Returns "Error: ..." on failure."""
+        version = self.version()
+        with self._lock:
+            if self._schema and self._schema[0] == version:
+                return self._schema[1]
+        try:
+            schema = self.reflect_schema()
+        except Exception as e:
+            return f"Error: {str(e)}"
+        with self._lock:
+            self._schema = (version, schema)
+        return schema
+
+    # ---------- Execution ----------
+    def _bounded(self, conn, sql: str, guard: Optional[QueryGuard] = None,
+                 ms: Optional[float] = None) -> Tuple[str, bool]:
+        """
+        SQL for one statement bounded by the guard's deadline (or ms): a progress
+        handler on SQLite, SET LOCAL on PostgreSQL, an optimizer hint on MySQL and
+        SET STATEMENT on MariaDB. Returns (sql, whether a limit applies).
+        """
+        from sqlalchemy import text
+
+        if self.dialect == "sqlite":
+            raw = conn.connection.dbapi_connection
+            if guard is None:
+                deadline = time.monotonic() + ms / 1000.0
+                guard = lambda: int(time.monotonic() > deadline)
+            raw.set_progress_handler(guard, PROGRESS_STEPS)
+            return sql, True
+        if ms is None and guard is not None and guard.deadline is not None:
+            ms = max(1.0, (guard.deadline - time.monotonic()) * 1000.0)
+        statement = STATEMENT_TIMEOUT.get(self.dialect)
+        if not statement or not ms:
+            return sql, False
+        if self.dialect == "postgresql":
+            conn.execute(text(statement.format(ms=int(ms))))
+        elif self.dialect == "mysql":
+            hint = statement.format(ms=int(ms))
+            if re.match(r"SELECT\b", sql, re.IGNORECASE):
+                sql = hint + sql[len("SELECT"):]
+            else:
+                # The hint is only read in the outermost SELECT
+                sql = f"{hint} * FROM ({sql}) AS q"
+        else:
+            sql = statement.format(s=ms / 1000.0, sql=sql)
+        return sql, True
+
+    def _release(self, conn):
+        """Drop a SQLite progress handler before the connection goes back to the pool"""
+        if self.dialect == "sqlite":
+            conn.connection.dbapi_connection.set_progress_handler(None, 0)
+
+    def _compiled(self, statement) -> str:
+        return str(statement.compile(dialect=self.engine.dialect, compile_kwargs={"literal_binds": True}))
+
+    def _count_rows(self, conn, sql: str) -> Optional[int]:
+        """Exact COUNT(*) if the dialect can bound it to COUNT_BUDGET_MS, else None"""
+        from sqlalchemy import func, select, text
+
+        try:
+            count = self._compiled(select(func.count()).select_from(text(f"({sql})").columns().subquery("q")))
+            count, bounded = self._bounded(conn, count, ms=COUNT_BUDGET_MS)
+            if not bounded:
+                return None
+            return conn.execute(text(count)).scalar()
+        except Exception:
+            return None
+        finally:
+            self._release(conn)
+
+    def run(self, query: str, offset: int = 0, max_rows: int = MAX_RESULT_ROWS, max_bytes: int = MAX_RESULT_BYTES,
+            total: Optional[int] = None, total_is_estimate: bool = False, guard: Optional[QueryGuard] = None,
+            **kwargs) -> Union[QueryResult, str]:
+        """
+        Same contract as sql_database.run_query. Rows stream through a
+        server-side cursor and stop at max_rows / max_bytes; later pages add a
+        dialect-compiled OFFSET. The guard's deadline becomes a statement
+        timeout where the dialect has one, and cancel/deadline are also
+        checked between fetches. SQLite-only options (snapshot, spill) are ignored.
+        """
+        from sqlalchemy import literal_column, select, text
+
+        problem = read_only_problem(query)
+        if problem:
+            return f"SQL error: {problem}"
+        sql = _strip_statement(query)
+        guard = guard or QueryGuard()
+        try:
+            with self.engine.connect() as conn:
+                try:
+                    statement = sql
+                    if offset:
+                        statement = self._compiled(select(literal_column("*")).select_from(
+                            text(f"({sql})").columns().subquery("q")).limit(int(max_rows) + 1).offset(int(offset)))
+                    statement, _ = self._bounded(conn, statement, guard)
+                    cursor = conn.execution_options(stream_results=True, max_row_buffer=FETCH_BATCH_ROWS).execute(text(statement))
+                    columns = list(cursor.keys())
+
+                    rows: List[tuple] = []
+                    size = 0
+                    has_more = False
+                    while not has_more:
+                        if guard.interrupted():
+                            raise TimeoutError(guard.reason)
+                        batch = cursor.fetchmany(FETCH_BATCH_ROWS)
+                        if not batch:
+                            break
+                        for row in batch:
+                            if len(rows) >= max_rows or size >= max_bytes:
+                                has_more = True
+                                break
+                            rows.append(tuple(row))
+                            size += _row_bytes(rows[-1])
+                    cursor.close()
+                finally:
+                    self._release(conn)
+
+                result = QueryResult(query, columns, rows, offset, has_more, table=arrow_table(columns, rows))
+                if not has_more:
+                    result.total, result.total_is_estimate = offset + len(rows), False
+                elif total is None:
+                    result.total, result.total_is_estimate = self._count_rows(conn, sql), False
+                else:
+                    result.total, result.total_is_estimate = total, total_is_estimate
+                conn.rollback()
+        except Exception as e:
+            if guard.reason:
+                return f"SQL error: query {guard.reason}"
+            return f"SQL error: {str(e)}"
+        return result
+
+    def validate(self, query: str, **kwargs) -> QueryCheck:
+        """
+        Read-only statement check, then a compile check with EXPLAIN where the
+        dialect supports it. Plan formats differ between engines, so there is
+        no plan cost gate here (see sql_database.validate_query for SQLite files).
+        """
+        from sqlalchemy import text
+
+        sql = _strip_statement(query)
+        problem = read_only_problem(sql)
+        if problem:
+            return QueryCheck("reject", sql, problem)
+        if self.dialect in EXPLAIN_DIALECTS:
+            try:
+                with self.engine.connect() as conn:
+                    conn.execute(text(f"EXPLAIN {sql}")).fetchall()
+                    conn.rollback()
+            except Exception as e:
+                return QueryCheck("revise", sql, f"the query does not compile: {str(e).splitlines()[0]}")
+        return QueryCheck("ok", sql)
+
+    def dispose(self):
+        self.engine.dispose()
+
+# ==================== REGISTRY ====================
+_backends: Dict[str, SQLAlchemyBackend] = {}
+_backends_lock = threading.Lock()
+
+def get_backend(source: str) -> Union[SQLiteBackend, SQLAlchemyBackend]:
+    """Backend for a SQLite file path or an SQLAlchemy URL; engines are kept per URL for the process"""
+    if not is_database_url(source):
+        return SQLiteBackend(source)
+    with _backends_lock:
+        backend = _backends.get(source)
+        if backend is None:
+            backend = _backends[source] = SQLAlchemyBackend(source)
+        return backend
+
+def close_backend(source: str):
+    with _backends_lock:
+        backend = _backends.pop(source, None)
+    if backend is not None:
+        backend.dispose()
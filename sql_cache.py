@@ -0,0 +1,120 @@
+import re
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ==================== CONFIGURATION ====================
+SQL_CACHE_ENTRIES = 1024
+RESULT_CACHE_ENTRIES = 128
+RESULT_CACHE_BYTES = 64 * 1024 * 1024
+
+# ==================== LRU CACHE ====================
+class LRUCache:
+    """Thread-safe LRU cache bounded by entry count and, optionally, total weight (e.g. bytes)"""
+    def __init__(self, max_entries: int, max_weight: Optional[int] = None,
+                 weigher: Optional[Callable[[Any], int]] = None):
+        self.max_entries = max_entries
+        self.max_weight = max_weight
+        self.weigher = weigher or (lambda value: 1)
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any):
+        weight = self.weigher(value)
+        if self.max_weight is not None and weight > self.max_weight:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.weight -= old[1]
+            self._entries[key] = (value, weight)
+            self.weight += weight
+            while len(self._entries) > self.max_entries or (self.max_weight is not None and self.weight > self.max_weight):
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.weight -= evicted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.weight = 0
+
+# ==================== KEYS ====================
+def normalize_question(question: str) -> str:
+    """Case-, whitespace- and trailing-punctuation-insensitive form of a question"""
+    return re.sub(r"\s+", " ", question.strip().lower()).rstrip(" ?!.")
+
+def normalize_sql(sql: str) -> str:
+    # Inner whitespace is kept: it may sit inside string literals
+    return sql.strip().rstrip("; \t\n")
+
+_fingerprints: Dict[int, Tuple[Any, str]] = {}
+_fingerprints_lock = threading.Lock()
+
+def schema_fingerprint(schema: Dict[str, Any]) -> str:
+    """Stable hash of a schema, memoized per schema object (see sql_database.load_schema)"""
+    with _fingerprints_lock:
+        cached = _fingerprints.get(id(schema))
+        if cached and cached[0] is schema:
+            return cached[1]
+    fingerprint = hashlib.sha1(json.dumps(schema, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    with _fingerprints_lock:
+        if len(_fingerprints) >= 64:
+            _fingerprints.clear()
+        _fingerprints[id(schema)] = (schema, fingerprint)
+    return fingerprint
+
+# ==================== NL→SQL AND SQL→RESULT CACHES ====================
+def _result_weight(value) -> int:
+    return value[0].nbytes + 1024
+
+_sql_cache = LRUCache(SQL_CACHE_ENTRIES)
+_result_cache = LRUCache(RESULT_CACHE_ENTRIES, max_weight=RESULT_CACHE_BYTES, weigher=_result_weight)
+
+def get_cached_sql(question: str, schema: Dict[str, Any], model: Optional[str] = None) -> Optional[str]:
+    return _sql_cache.get((normalize_question(question), schema_fingerprint(schema), model))
+
+def cache_sql(question: str, schema: Dict[str, Any], sql: str, model: Optional[str] = None):
+    _sql_cache.put((normalize_question(question), schema_fingerprint(schema), model), sql)
+
+def get_cached_result(sql: str, db_path: str) -> Optional[Tuple[Any, Optional[str]]]:
+    """(first result page, explanation) for SQL on the current version of the database"""
+    from sql_database import database_version
+    return _result_cache.get((normalize_sql(sql), database_version(db_path)))
+
+def cache_result(sql: str, db_path: str, result, explanation: Optional[str] = None):
+    from sql_database import database_version
+    _result_cache.put((normalize_sql(sql), database_version(db_path)), (result, explanation))
+
+def clear_caches():
+    _sql_cache.clear()
+    _result_cache.clear()
+
+def cache_stats() -> Dict[str, int]:
+    return {
+        "sql_entries": len(_sql_cache),
+        "sql_hits": _sql_cache.hits,
+        "result_entries": len(_result_cache),
+        "result_hits": _result_cache.hits,
+        "result_bytes": _result_cache.weight
+    }
@@ -0,0 +1,818 @@
+import os
+import re
+import numbers
+import time
+import hashlib
+import itertools
+import sqlite3
+import logging
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# ==================== CONFIGURATION ====================
+POOL_SIZE = int(os.environ.get("SQL_POOL_SIZE", "4"))
+CACHE_SIZE_KIB = 32 * 1024
+MMAP_SIZE = 256 * 1024 * 1024
+MAX_RESULT_ROWS = 1000
+MAX_RESULT_BYTES = 8 * 1024 * 1024
+FETCH_BATCH_ROWS = 200
+COUNT_BUDGET_MS = 250
+PROGRESS_STEPS = 10000
+QUERY_TIMEOUT_S = float(os.environ.get("SQL_QUERY_TIMEOUT_S", "15"))
+QUERY_MAX_STEPS = int(os.environ.get("SQL_QUERY_MAX_STEPS", "0"))  # SQLite VM steps; 0 = no limit
+QUERY_WORKERS = 4
+LARGE_TABLE_ROWS = 100000
+AUTO_LIMIT_ROWS = 10 * MAX_RESULT_ROWS
+MAX_PLAN_COST = int(os.environ.get("SQL_MAX_PLAN_COST", "50000000"))  # estimated row visits
+SNAPSHOT_MAX_BYTES = int(os.environ.get("SQL_SNAPSHOT_MAX_BYTES", str(256 * 1024 * 1024)))
+SPILL_DIR = Path(os.environ.get("SQL_SPILL_DIR", Path(__file__).parent / "tmp" / "sql_results"))
+SPILL_MAX_BYTES = int(os.environ.get("SQL_SPILL_MAX_BYTES", str(512 * 1024 * 1024)))  # Arrow bytes per result
+SPILL_BATCH_ROWS = 5000
+SPILL_TIMEOUT_S = float(os.environ.get("SQL_SPILL_TIMEOUT_S", "60"))
+SPILL_WORKERS = 2
+MAX_SPILL_FILES = 32
+
+# ==================== CONNECTION POOL ====================
+def _file_identity(path: str) -> Tuple[int, int, int]:
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+class ConnectionPool:
+    """
+    Thread-safe pool of read-only connections to one SQLite file (or to a
+    fixed URI such as an in-memory snapshot).
+
+    Connections keep SQLite's page cache and statement cache warm between
+    questions. Idle connections are dropped if the file is replaced on disk.
+    """
+    def __init__(self, db_path: str, size: int = POOL_SIZE, uri: Optional[str] = None):
+        self.db_path = str(Path(db_path).resolve())
+        self.size = size
+        self.uri = uri
+        self._idle: List[sqlite3.Connection] = []
+        self._identity = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        uri = self.uri or f"{Path(self.db_path).as_uri()}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.execute("PRAGMA query_only=ON")
+        conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KIB}")
+        conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection for the duration of a with-block"""
+        if self.uri and self._closed:
+            # A replaced snapshot's memory database may already be gone; connecting
+            # to its URI would open a new, empty one, so read the file instead
+            with get_pool(self.db_path).connection() as conn:
+                yield conn
+            return
+
+        # A snapshot URI never changes underneath its pool
+        identity = None if self.uri else _file_identity(self.db_path)
+        with self._lock:
+            if identity != self._identity:
+                stale, self._idle = self._idle, []
+                self._identity = identity
+                for conn in stale:
+                    conn.close()
+            conn = self._idle.pop() if self._idle else None
+
+        if conn is None:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            with self._lock:
+                if not self._closed and identity == self._identity and len(self._idle) < self.size:
+                    self._idle.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_path: str) -> ConnectionPool:
+    """Process-wide pool for a database file, shared by every session using it"""
+    key = str(Path(db_path).resolve())
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(key)
+        return pool
+
+def close_pool(db_path: str):
+    """Close and forget a database's pool (e.g. before its file is deleted)"""
+    with _pools_lock:
+        pool = _pools.pop(str(Path(db_path).resolve()), None)
+    if pool is not None:
+        pool.close()
+
+# ==================== IN-MEMORY SNAPSHOTS ====================
+class Snapshot:
+    """
+    Copy of a database in a shared-cache in-memory SQLite, made with the backup API.
+    The keeper connection holds the memory database open for the pool's readers.
+    """
+    _serial = itertools.count()
+
+    def __init__(self, db_path: str, version: tuple):
+        self.db_path = db_path
+        self.version = version
+        name = hashlib.sha1(db_path.encode("utf-8")).hexdigest()[:12]
+        self.uri = f"file:sqlsnap-{name}-{next(self._serial)}?mode=memory&cache=shared"
+        self.keeper = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        with get_pool(db_path).connection() as source:
+            source.backup(self.keeper)
+        self.pool = ConnectionPool(db_path, uri=self.uri)
+
+    def close(self):
+        self.pool.close()
+        # Readers still holding connections keep the memory database alive until they finish
+        self.keeper.close()
+
+_snapshots: Dict[str, Snapshot] = {}
+_snapshots_lock = threading.Lock()
+# One lock per database, held while its copy is made, so a large copy only
+# blocks callers of that database
+_snapshot_locks: Dict[str, threading.Lock] = {}
+
+def _current_snapshot(path: str, version: tuple) -> Tuple[Optional[Snapshot], Optional[ConnectionPool]]:
+    with _snapshots_lock:
+        snapshot = _snapshots.get(path)
+    if snapshot is not None and snapshot.version == version:
+        return snapshot, snapshot.pool
+    return snapshot, None
+
+def get_snapshot_pool(db_path: str) -> Optional[ConnectionPool]:
+    """
+    Pool over an in-memory snapshot of the database, loaded once per process and
+    reloaded when the file changes. None if the database exceeds SNAPSHOT_MAX_BYTES.
+    """
+    version = database_version(db_path)
+    path = version[0]
+    _, pool = _current_snapshot(path, version)
+    if pool is not None:
+        return pool
+
+    with _snapshots_lock:
+        lock = _snapshot_locks.setdefault(path, threading.Lock())
+    with lock:
+        # Another caller may have loaded it while this one waited
+        snapshot, pool = _current_snapshot(path, version)
+        if pool is not None:
+            return pool
+        if os.path.getsize(path) > SNAPSHOT_MAX_BYTES:
+            return None
+
+        started = time.perf_counter()
+        fresh = Snapshot(path, version)
+        with _snapshots_lock:
+            _snapshots[path] = fresh
+        logger.info(f"Loaded in-memory snapshot of {path} in {time.perf_counter() - started:.2f}s")
+
+    if snapshot is not None:
+        snapshot.close()
+    return fresh.pool
+
+def query_pool(db_path: str, snapshot: bool = False) -> ConnectionPool:
+    """Pool that queries should use: the in-memory snapshot if requested and possible, else the file"""
+    if snapshot:
+        try:
+            pool = get_snapshot_pool(db_path)
+            if pool is not None:
+                return pool
+        except sqlite3.Error as e:
+            logger.warning(f"In-memory snapshot unavailable for {db_path}: {e}")
+    return get_pool(db_path)
+
+def database_version(db_path: str) -> tuple:
+    """
+    Identity of a database file's current contents: (path, inode, size, mtime)
+    of the file and of its WAL, which receives commits before a checkpoint.
+    PRAGMA data_version is per-connection, so it cannot be compared across the pool.
+    SQLAlchemy URLs get their backend's version instead (see sql_backends).
+    """
+    from sql_backends import get_backend, is_database_url
+    if is_database_url(db_path):
+        return get_backend(db_path).version()
+
+    path = str(Path(db_path).resolve())
+    version = (path,) + _file_identity(path)
+    try:
+        version += _file_identity(path + "-wal")
+    except FileNotFoundError:
+        pass
+    return version
+
+# ==================== SCHEMA ====================
+Schema = Dict[str, List[Dict[str, Any]]]
+
+_schema_cache: Dict[str, Tuple[tuple, Schema]] = {}
+_schema_lock = threading.Lock()
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+def introspect_schema(conn: sqlite3.Connection) -> Schema:
+    """
+    {table: [column, ...]} where each column has name, type, pk, notnull,
+    fk ("Table.column" it references, or None) and indexed / unique flags.
+    """
+    tables = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY rowid"
+    )]
+
+    schema: Schema = {}
+    for table in tables:
+        columns = {
+            row[1]: {"name": row[1], "type": row[2], "pk": row[5] > 0, "notnull": bool(row[3]),
+                     "fk": None, "indexed": row[5] > 0, "unique": False}
+            for row in conn.execute(f"PRAGMA table_info({_quote(table)})")
+        }
+
+        # (id, seq, table, from, to, on_update, on_delete, match); "to" is NULL for implicit PK references
+        for row in conn.execute(f"PRAGMA foreign_key_list({_quote(table)})"):
+            if row[3] in columns:
+                columns[row[3]]["fk"] = f"{row[2]}.{row[4]}" if row[4] else row[2]
+
+        # (seq, name, unique, origin, partial)
+        for index in conn.execute(f"PRAGMA index_list({_quote(table)})").fetchall():
+            for info in conn.execute(f"PRAGMA index_info({_quote(index[1])})"):
+                if info[2] in columns:
+                    columns[info[2]]["indexed"] = True
+                    columns[info[2]]["unique"] = columns[info[2]]["unique"] or bool(index[2])
+
+        schema[table] = list(columns.values())
+    return schema
+
+def load_schema(db_path: str) -> Union[Schema, str]:
+    """
+    Schema of a database, cached per (path, size, mtime, schema_version) and
+    re-read only when the file or its schema changes. Returns "Error: ..." on failure.
+    """
+    try:
+        path = str(Path(db_path).resolve())
+        stat = os.stat(path)
+        with get_pool(path).connection() as conn:
+            version = conn.execute("PRAGMA schema_version").fetchone()[0]
+            key = (stat.st_size, stat.st_mtime_ns, version)
+
+            with _schema_lock:
+                cached = _schema_cache.get(path)
+            if cached and cached[0] == key:
+                return cached[1]
+
+            schema = introspect_schema(conn)
+
+        with _schema_lock:
+            _schema_cache[path] = (key, schema)
+        return schema
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+# ==================== QUERY EXECUTION ====================
+class QueryGuard:
+    """
+    Deadline, VM-step budget and cancel flag for one query, enforced through
+    sqlite3's progress handler (checked every PROGRESS_STEPS VM instructions).
+    """
+    def __init__(self, timeout_s: float = QUERY_TIMEOUT_S, max_steps: int = QUERY_MAX_STEPS):
+        self.timeout_s = timeout_s
+        self.max_steps = max_steps
+        self.deadline = time.monotonic() + timeout_s if timeout_s else None
+        self.steps = 0
+        self.reason: Optional[str] = None
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def interrupted(self) -> bool:
+        """Cancel and deadline check, for callers without a progress handler"""
+        if self._cancelled.is_set():
+            self.reason = "was cancelled"
+        elif self.deadline is not None and time.monotonic() > self.deadline:
+            self.reason = f"timed out after {self.timeout_s:g} s"
+        return self.reason is not None
+
+    def __call__(self) -> int:
+        self.steps += PROGRESS_STEPS
+        if not self.interrupted() and self.max_steps and self.steps > self.max_steps:
+            self.reason = f"exceeded the budget of {self.max_steps:,} steps"
+        return 1 if self.reason else 0
+
+class QueryResult:
+    """
+    One page of a query's rows, with the offset to fetch the next page and the
+    total (or an estimate). With pyarrow the page is held as an Arrow table
+    (typed columns, rendered without pandas object copies); rows beyond it may
+    be spilled to a Parquet file for paging and download.
+    """
+    def __init__(self, query: str, columns: List[str], rows: Optional[List[tuple]] = None, offset: int = 0,
+                 has_more: bool = False, total: Optional[int] = None, total_is_estimate: bool = False,
+                 table=None):
+        self.query = query
+        self.columns = columns
+        self._rows = rows if table is None else None
+        self.table = table
+        self.offset = offset
+        self.has_more = has_more
+        self.total = total
+        self.total_is_estimate = total_is_estimate
+        # Parquet file holding result rows [0, spilled_rows); spill_complete if that is all of them
+        self.spill_path: Optional[str] = None
+        self.spilled_rows = 0
+        self.spill_complete = False
+
+    def __len__(self) -> int:
+        return self.table.num_rows if self.table is not None else len(self._rows)
+
+    @property
+    def rows(self) -> List[tuple]:
+        if self.table is None:
+            return self._rows
+        return list(zip(*(column.to_pylist() for column in self.table.columns)))
+
+    @property
+    def nbytes(self) -> int:
+        if self.table is not None:
+            return self.table.nbytes
+        return sum(_row_bytes(row) for row in self._rows)
+
+    @property
+    def next_offset(self) -> int:
+        return self.offset + len(self)
+
+    @property
+    def frame(self):
+        if self.table is not None:
+            return self.table.to_pandas()
+        import pandas as pd
+        return pd.DataFrame.from_records(self._rows, columns=self.columns)
+
+    @property
+    def data(self):
+        """What to hand to st.dataframe: the Arrow table when there is one"""
+        return self.table if self.table is not None else self.frame
+
+    @property
+    def total_label(self) -> str:
+        """Total row count for display: exact, "~" estimate, or a lower bound"""
+        if self.total is None:
+            return f"more than {self.next_offset:,}"
+        return f"{'~' if self.total_is_estimate else ''}{self.total:,}"
+
+    def describe(self) -> str:
+        """e.g. "Showing rows 1–1,000 of ~2,240,000" """
+        if not len(self):
+            return "No rows"
+        if not self.has_more and self.offset == 0:
+            return f"{len(self):,} row{'' if len(self) == 1 else 's'}"
+        return f"Showing rows {self.offset + 1:,}–{self.next_offset:,} of {self.total_label}"
+
+    def inherit_spill(self, other: "QueryResult"):
+        """Share the spill file of another page of the same query"""
+        self.spill_path, self.spilled_rows, self.spill_complete = other.spill_path, other.spilled_rows, other.spill_complete
+
+    @property
+    def spill_available(self) -> bool:
+        return bool(self.spill_path) and os.path.exists(self.spill_path)
+
+def _row_bytes(row: tuple) -> int:
+    return sum(len(value) if isinstance(value, (str, bytes)) else 8 for value in row)
+
+def _strip_statement(query: str) -> str:
+    return query.strip().rstrip(";").strip()
+
+def _table_rows(conn: sqlite3.Connection, table: str) -> Optional[int]:
+    """Row estimate for a table from sqlite_stat1, else its largest rowid"""
+    try:
+        stat = conn.execute("SELECT stat FROM sqlite_stat1 WHERE tbl=? AND idx IS NULL", (table,)).fetchone()
+        if stat:
+            return int(stat[0].split()[0])
+    except sqlite3.Error:
+        pass
+    try:
+        return conn.execute(f"SELECT MAX(rowid) FROM {_quote(table)}").fetchone()[0]
+    except sqlite3.Error:
+        return None
+
+def _estimate_rows(conn: sqlite3.Connection, sql: str) -> Optional[int]:
+    """Row estimate for a plain full scan of one table"""
+    plan = [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+    match = re.match(r"SCAN (?:TABLE )?(\w+)$", plan[0]) if len(plan) == 1 else None
+    return _table_rows(conn, match.group(1)) if match else None
+
+def _count_rows(conn: sqlite3.Connection, sql: str, budget_ms: float = COUNT_BUDGET_MS) -> Tuple[Optional[int], bool]:
+    """(total, is_estimate): an exact COUNT(*) if it finishes within the budget, else a plan-based estimate"""
+    deadline = time.monotonic() + budget_ms / 1000.0
+    conn.set_progress_handler(lambda: int(time.monotonic() > deadline), PROGRESS_STEPS)
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM ({sql})").fetchone()[0], False
+    except sqlite3.OperationalError:
+        pass
+    finally:
+        conn.set_progress_handler(None, 0)
+    try:
+        return _estimate_rows(conn, sql), True
+    except sqlite3.Error:
+        return None, True
+
+# ==================== VALIDATION ====================
+# Authorizer actions a read-only query may perform
+READ_ONLY_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+ACTION_NAMES = {
+    sqlite3.SQLITE_INSERT: "INSERT",
+    sqlite3.SQLITE_UPDATE: "UPDATE",
+    sqlite3.SQLITE_DELETE: "DELETE",
+    sqlite3.SQLITE_PRAGMA: "PRAGMA",
+    sqlite3.SQLITE_ATTACH: "ATTACH",
+    sqlite3.SQLITE_DETACH: "DETACH",
+    sqlite3.SQLITE_TRANSACTION: "a transaction",
+    sqlite3.SQLITE_CREATE_TABLE: "CREATE TABLE",
+    sqlite3.SQLITE_DROP_TABLE: "DROP TABLE",
+    sqlite3.SQLITE_ALTER_TABLE: "ALTER TABLE"
+}
+
+def read_only_authorizer(action: int, arg1, arg2, db_name, trigger) -> int:
+    return sqlite3.SQLITE_OK if action in READ_ONLY_ACTIONS else sqlite3.SQLITE_DENY
+
+class QueryCheck:
+    """
+    Outcome of validating a query before execution:
+      ok       run as is
+      limited  run sql, which had a LIMIT added
+      revise   compiles badly or looks too expensive; ask the model for another query
+      reject   not a read-only query
+    """
+    def __init__(self, verdict: str, sql: str, reason: str = "", cost: Optional[int] = None):
+        self.verdict = verdict
+        self.sql = sql
+        self.reason = reason
+        self.cost = cost
+
+    @property
+    def ok(self) -> bool:
+        return self.verdict in ("ok", "limited")
+
+def _plan_cost(conn: sqlite3.Connection, plan: List[tuple], sql: str, tables: set) -> Tuple[int, List[str]]:
+    """
+    Estimated row visits of a query plan and the large tables it scans. Scans
+    under the same parent are nested loops (their rows multiply); separate
+    branches (subqueries, compound parts) add up.
+    """
+    loops: Dict[int, int] = {}
+    large = []
+    for _, parent, _, detail in plan:
+        match = re.match(r"SCAN (?:TABLE )?(\w+)", detail)
+        if not match or match.group(1) in ("CONSTANT", "SUBQUERY"):
+            continue
+        name = match.group(1)
+        if name not in tables:
+            # The plan shows aliases; map them back to a table the query reads
+            alias = re.search(rf'"?(\w+)"?\s+(?:AS\s+)?{re.escape(name)}\b', sql, re.IGNORECASE)
+            name = alias.group(1) if alias and alias.group(1) in tables else name
+        rows = _table_rows(conn, name) or 1
+        if rows >= LARGE_TABLE_ROWS:
+            large.append(name)
+        loops[parent] = loops.get(parent, 1) * rows
+    return sum(loops.values()), large
+
+def _outer_limit(sql: str) -> Optional[int]:
+    """Row limit of the outermost statement, ignoring LIMITs in subqueries, CTEs and literals"""
+    outer = re.sub(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|--[^\n]*|/\*.*?\*/", " ", sql, flags=re.DOTALL)
+    while True:
+        stripped = re.sub(r"\([^()]*\)", " ", outer)
+        if stripped == outer:
+            break
+        outer = stripped
+    match = re.search(r"\bLIMIT\s+(\d+)\s*(?:$|OFFSET\b|,\s*(\d+))", outer, re.IGNORECASE)
+    if match is None:
+        return None
+    # "LIMIT offset, count" puts the count second
+    return int(match.group(2) or match.group(1))
+
+def validate_query(db_path: str, query: str, snapshot: bool = False) -> QueryCheck:
+    """
+    Compile a query without running it (EXPLAIN) under a read-only authorizer,
+    then gate it on its EXPLAIN QUERY PLAN: reject writes, send back queries
+    that fail to compile or would visit more than MAX_PLAN_COST rows, and add
+    a LIMIT to unbounded scans of large tables. SQLAlchemy URLs are checked
+    by their backend.
+    """
+    from sql_backends import get_backend, is_database_url
+    if is_database_url(db_path):
+        return get_backend(db_path).validate(query)
+
+    sql = _strip_statement(query)
+    tables: set = set()
+    denied: List[str] = []
+
+    def authorize(action, arg1, arg2, db_name, trigger):
+        if action == sqlite3.SQLITE_READ:
+            tables.add(arg1)
+        if action in READ_ONLY_ACTIONS:
+            return sqlite3.SQLITE_OK
+        denied.append(ACTION_NAMES.get(action, "a schema change"))
+        return sqlite3.SQLITE_DENY
+
+    try:
+        with query_pool(db_path, snapshot).connection() as conn:
+            conn.set_authorizer(authorize)
+            try:
+                conn.execute(f"EXPLAIN {sql}")
+                plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+            except (sqlite3.Error, sqlite3.Warning) as e:
+                if denied:
+                    return QueryCheck("reject", sql, f"only read-only SELECT queries are allowed (query attempts {denied[0]})")
+                return QueryCheck("revise", sql, f"the query does not compile: {e}")
+            finally:
+                conn.set_authorizer(None)
+            cost, large = _plan_cost(conn, plan, sql, tables)
+    except Exception as e:
+        return QueryCheck("revise", sql, str(e))
+
+    if cost > MAX_PLAN_COST:
+        scanned = ", ".join(dict.fromkeys(large)) or "several tables"
+        return QueryCheck("revise", sql, f"the query plan would visit about {cost:,} rows "
+                                         f"(full scans of {scanned}); filter on indexed columns or join on keys", cost)
+    limit = _outer_limit(sql)
+    if large and (limit is None or limit > AUTO_LIMIT_ROWS):
+        return QueryCheck("limited", f"SELECT * FROM ({sql}) LIMIT {AUTO_LIMIT_ROWS}",
+                          f"LIMIT {AUTO_LIMIT_ROWS:,} added to a scan of {', '.join(dict.fromkeys(large))}", cost)
+    return QueryCheck("ok", sql, cost=cost)
+
+# ==================== ARROW RESULTS ====================
+def _pyarrow():
+    try:
+        import pyarrow
+        return pyarrow
+    except ImportError:
+        return None
+
+def _unique_names(columns: List[str]) -> List[str]:
+    """Column names made unique for Arrow/Parquet (joins often return two "Name" columns)"""
+    seen: Dict[str, int] = {}
+    names = []
+    for column in columns:
+        seen[column] = seen.get(column, 0) + 1
+        names.append(column if seen[column] == 1 else f"{column}_{seen[column]}")
+    return names
+
+def _arrow_column(pa, values: List[Any], type=None):
+    """Arrow array for one column; SQLite's per-value typing can mix types, which fall back to text"""
+    try:
+        return pa.array(values, type=type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        if type is not None and not pa.types.is_string(type):
+            raise
+        return pa.array([None if v is None else str(v) for v in values], type=pa.string())
+
+def arrow_table(columns: List[str], rows: List[tuple], schema=None):
+    """Arrow table from fetched rows (typed to schema if given), or None without pyarrow"""
+    pa = _pyarrow()
+    if pa is None:
+        return None
+    values = [list(column) for column in zip(*rows)] if rows else [[] for _ in columns]
+    types = [field.type for field in schema] if schema is not None else [None] * len(columns)
+    arrays = [_arrow_column(pa, column, type) for column, type in zip(values, types)]
+    return pa.Table.from_arrays(arrays, names=_unique_names(columns))
+
+def _spill_schema(table):
+    """Page schema for the spill file; all-NULL columns become text so later values fit"""
+    import pyarrow as pa
+    return pa.schema([
+        pa.field(field.name, pa.string()) if pa.types.is_null(field.type) else field
+        for field in table.schema
+    ])
+
+def _collect_spills(keep: str):
+    files = sorted(SPILL_DIR.glob("*.parquet"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for path in files[MAX_SPILL_FILES:]:
+        if str(path) != keep:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+def _spill_result(stack: ExitStack, conn: sqlite3.Connection, cursor: sqlite3.Cursor,
+                  result: QueryResult, remainder: List[tuple]):
+    """
+    Background continuation of a query: write its first page and the rest of
+    the cursor (up to SPILL_MAX_BYTES / SPILL_TIMEOUT_S) to result.spill_path.
+    The file appears once complete; until then later pages re-run the query.
+    The stack holds the borrowed pool connection and is closed at the end.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    with stack:
+        guard = QueryGuard(timeout_s=SPILL_TIMEOUT_S)
+        conn.set_progress_handler(guard, PROGRESS_STEPS)
+        path = Path(result.spill_path)
+        tmp = path.with_suffix(".tmp")
+        schema = _spill_schema(result.table)
+        written, size, complete = 0, 0, False
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with pq.ParquetWriter(str(tmp), schema) as writer:
+                writer.write_table(result.table.cast(schema))
+                written, size = len(result), result.nbytes
+                rows = remainder
+                try:
+                    while size < SPILL_MAX_BYTES:
+                        rows = rows or cursor.fetchmany(SPILL_BATCH_ROWS)
+                        if not rows:
+                            complete = True
+                            break
+                        table = arrow_table(result.columns, rows, schema)
+                        writer.write_table(table)
+                        written += len(rows)
+                        size += table.nbytes
+                        rows = None
+                except (sqlite3.Error, pa.ArrowException) as e:
+                    # Time limit, or a later value that does not fit the first page's column types
+                    logger.info(f"Stopped spilling after {written:,} rows: {guard.reason or e}")
+            result.spilled_rows, result.spill_complete = written, complete
+            if complete:
+                result.total, result.total_is_estimate = written, False
+            os.replace(tmp, path)
+        except Exception as e:
+            logger.warning(f"Could not spill result: {e}")
+            result.spill_path = None
+        finally:
+            cursor.close()
+            conn.set_progress_handler(None, 0)
+            if tmp.exists():
+                tmp.unlink()
+        _collect_spills(keep=str(path))
+
+def read_spilled_page(result: QueryResult, offset: int, max_rows: int = MAX_RESULT_ROWS) -> Optional[QueryResult]:
+    """Page of a spilled result read from its Parquet file; None if not spilled that far or the file is gone"""
+    if not result.spill_available or not 0 <= offset < result.spilled_rows:
+        return None
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    try:
+        parquet = pq.ParquetFile(result.spill_path)
+        groups, first, start = [], None, 0
+        for i in range(parquet.num_row_groups):
+            rows = parquet.metadata.row_group(i).num_rows
+            if start + rows > offset and start < offset + max_rows:
+                groups.append(i)
+                first = start if first is None else first
+            start += rows
+        table = parquet.read_row_groups(groups).slice(offset - first, max_rows)
+    except (OSError, pa.ArrowException) as e:
+        logger.info(f"Spilled result unavailable: {e}")
+        return None
+
+    end = offset + table.num_rows
+    page = QueryResult(result.query, result.columns, offset=offset,
+                       has_more=end < result.spilled_rows or not result.spill_complete,
+                       total=result.total, total_is_estimate=result.total_is_estimate, table=table)
+    page.inherit_spill(result)
+    return page
+
+def run_query(db_path: str, query: str, offset: int = 0, max_rows: int = MAX_RESULT_ROWS,
+              max_bytes: int = MAX_RESULT_BYTES, total: Optional[int] = None,
+              total_is_estimate: bool = False, guard: Optional[QueryGuard] = None,
+              snapshot: bool = False, spill: bool = False) -> Union[QueryResult, str]:
+    """
+    Run a query with fetchmany, stopping at max_rows rows or max_bytes of
+    values. Later pages re-run the query with an OFFSET; pass the first page's
+    total along so it is not recounted. The guard (a default QueryGuard if
+    None) can abort it; snapshot=True serves it from the in-memory copy, and
+    spill=True keeps writing the rows past the first page to Parquet in the
+    background (see read_spilled_page).
+    Returns "SQL error: ..." on failure.
+    """
+    sql = _strip_statement(query)
+    guard = guard or QueryGuard()
+    with ExitStack() as stack:
+        try:
+            conn = stack.enter_context(query_pool(db_path, snapshot).connection())
+            conn.set_progress_handler(guard, PROGRESS_STEPS)
+            conn.set_authorizer(read_only_authorizer)
+            try:
+                cursor = conn.cursor()
+                cursor.execute(f"SELECT * FROM ({sql}) LIMIT -1 OFFSET {int(offset)}" if offset else sql)
+                columns = [d[0] for d in cursor.description or []]
+
+                rows: List[tuple] = []
+                remainder: List[tuple] = []
+                size = 0
+                has_more = False
+                while not has_more:
+                    batch = cursor.fetchmany(FETCH_BATCH_ROWS)
+                    if not batch:
+                        break
+                    for i, row in enumerate(batch):
+                        if len(rows) >= max_rows or size >= max_bytes:
+                            has_more = True
+                            remainder = batch[i:]
+                            break
+                        rows.append(row)
+                        size += _row_bytes(row)
+                result = QueryResult(query, columns, rows, offset, has_more, table=arrow_table(columns, rows))
+            finally:
+                conn.set_progress_handler(None, 0)
+                conn.set_authorizer(None)
+
+            if not has_more:
+                result.total, result.total_is_estimate = offset + len(rows), False
+            elif total is None:
+                result.total, result.total_is_estimate = _count_rows(conn, sql)
+            else:
+                result.total, result.total_is_estimate = total, total_is_estimate
+
+            if spill and has_more and offset == 0 and result.table is not None:
+                # The spill keeps the cursor (and its pooled connection) after this returns
+                result.spill_path = str(SPILL_DIR / f"{uuid.uuid4().hex}.parquet")
+                _spill_executor.submit(_spill_result, stack.pop_all(), conn, cursor, result, remainder)
+            else:
+                cursor.close()
+        except Exception as e:
+            if guard.reason:
+                return f"SQL error: query {guard.reason}"
+            return f"SQL error: {str(e)}"
+
+    return result
+
+# ==================== RESULT SUMMARIES ====================
+def _format_value(value) -> str:
+    if isinstance(value, float):
+        return f"{value:,.0f}" if value.is_integer() else f"{value:,.2f}"
+    if isinstance(value, numbers.Integral) and not isinstance(value, bool):
+        return f"{int(value):,}"
+    return str(value)
+
+def summarize_result(result: QueryResult, max_columns: int = 6, top_values: int = 3) -> str:
+    """
+    Deterministic plain-language summary of a result page (row count, numeric
+    ranges, most common values), used instead of a second LLM call.
+    """
+    import pandas as pd
+
+    if not len(result):
+        return "The query returned no rows."
+    frame = result.frame
+    if frame.shape == (1, 1):
+        return f"The result is **{_format_value(frame.iat[0, 0])}** ({frame.columns[0]})."
+    if len(frame) == 1:
+        return "The query returned one row: " + ", ".join(
+            f"{column} = **{_format_value(value)}**" for column, value in frame.iloc[0].items()
+        ) + "."
+
+    lines = [f"The query returned {result.total_label} rows with columns {', '.join(map(str, frame.columns))}."]
+    if result.has_more or result.offset:
+        lines.append(f"Statistics cover rows {result.offset + 1:,}–{result.next_offset:,}.")
+
+    for column in frame.columns[:max_columns]:
+        series = frame[column].dropna()
+        if series.empty:
+            lines.append(f"- **{column}**: all values empty")
+        elif pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            lines.append(
+                f"- **{column}**: from {_format_value(series.min())} to {_format_value(series.max())}, "
+                f"average {_format_value(float(series.mean()))}"
+            )
+        else:
+            counts = series.astype(str).value_counts()
+            if counts.iloc[0] == 1:
+                examples = ", ".join(counts.index[:top_values])
+                lines.append(f"- **{column}**: {len(counts):,} distinct values, e.g. {examples}")
+            else:
+                common = ", ".join(f"{value} ({count:,})" for value, count in counts.head(top_values).items())
+                lines.append(f"- **{column}**: {len(counts):,} distinct values; most common {common}")
+    return "\n".join(lines)
+
+_query_executor = ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix="sql-query")
+_spill_executor = ThreadPoolExecutor(max_workers=SPILL_WORKERS, thread_name_prefix="sql-spill")
+
+def submit_query(db_path: str, query: str, guard: QueryGuard, **kwargs) -> Future:
+    """Run a query through its backend on a worker thread so the caller can stay responsive and cancel it"""
+    from sql_backends import get_backend
+    return _query_executor.submit(get_backend(db_path).run, query, guard=guard, **kwargs)
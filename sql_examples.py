@@ -0,0 +1,145 @@
+import os
+import math
+import time
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from sql_retrieval import tokenize
+
+logger = logging.getLogger(__name__)
+
+# ==================== CONFIGURATION ====================
+EXAMPLES_PATH = Path(os.environ.get("SQL_EXAMPLES_PATH", Path(__file__).parent / "tmp" / "sql_examples.db"))
+MAX_PROMPT_EXAMPLES = 3
+MAX_EXAMPLES_PER_SCHEMA = 500
+# Minimum share of the question's (idf-weighted) tokens an example must cover
+MIN_EXAMPLE_SIMILARITY = 0.2
+
+# ==================== STORE ====================
+class ExampleStore:
+    """
+    Verified (question, SQL) pairs per schema, persisted in SQLite and searched
+    by idf-weighted token overlap between questions (see sql_retrieval.tokenize).
+    The search index for a schema is built on first use and kept up to date on add.
+    """
+    def __init__(self, path: Path = EXAMPLES_PATH):
+        self.path = Path(path)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._indexes: Dict[str, List[Tuple[str, str, str, set]]] = {}
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS examples (
+                schema_key TEXT NOT NULL,
+                question_key TEXT NOT NULL,
+                question TEXT NOT NULL,
+                sql TEXT NOT NULL,
+                created REAL NOT NULL,
+                PRIMARY KEY (schema_key, question_key))""")
+        return self._conn
+
+    def _index(self, schema_key: str) -> List[Tuple[str, str, str, set]]:
+        index = self._indexes.get(schema_key)
+        if index is None:
+            rows = self._connection().execute(
+                "SELECT question_key, question, sql FROM examples WHERE schema_key=? ORDER BY created DESC LIMIT ?",
+                (schema_key, MAX_EXAMPLES_PER_SCHEMA)
+            ).fetchall()
+            index = self._indexes[schema_key] = [(key, q, sql, set(tokenize(q))) for key, q, sql in rows]
+        return index
+
+    def add(self, schema_key: str, question: str, sql: str):
+        """Record a question whose SQL ran successfully; a newer SQL for the same question replaces the old"""
+        from sql_cache import normalize_question
+
+        question_key = normalize_question(question)
+        with self._lock:
+            conn = self._connection()
+            conn.execute("INSERT OR REPLACE INTO examples VALUES (?, ?, ?, ?, ?)",
+                         (schema_key, question_key, question.strip(), sql, time.time()))
+            conn.execute("""DELETE FROM examples WHERE schema_key=? AND question_key NOT IN (
+                SELECT question_key FROM examples WHERE schema_key=? ORDER BY created DESC LIMIT ?)""",
+                         (schema_key, schema_key, MAX_EXAMPLES_PER_SCHEMA))
+            self._indexes.pop(schema_key, None)
+
+    def search(self, schema_key: str, question: str, k: int = MAX_PROMPT_EXAMPLES,
+               min_similarity: float = MIN_EXAMPLE_SIMILARITY) -> List[Dict[str, Any]]:
+        """Up to k stored examples most similar to the question, best first"""
+        from sql_cache import normalize_question
+
+        tokens = set(tokenize(question))
+        if not tokens:
+            return []
+        with self._lock:
+            index = self._index(schema_key)
+
+        document_frequency: Dict[str, int] = {}
+        for _, _, _, example_tokens in index:
+            for token in example_tokens & tokens:
+                document_frequency[token] = document_frequency.get(token, 0) + 1
+        idf = {token: math.log(1 + (len(index) + 1) / (document_frequency.get(token, 0) + 1)) for token in tokens}
+        total = sum(idf.values())
+
+        question_key = normalize_question(question)
+        scored = []
+        for example_key, example_question, sql, example_tokens in index:
+            if example_key == question_key:
+                continue  # The SQL cache already answers the identical question
+            similarity = sum(idf[token] for token in example_tokens & tokens) / total
+            if similarity >= min_similarity:
+                scored.append((similarity, example_question, sql))
+        scored.sort(key=lambda item: -item[0])
+        return [{"question": q, "sql": sql, "similarity": round(sim, 3)} for sim, q, sql in scored[:k]]
+
+    def count(self, schema_key: str) -> int:
+        with self._lock:
+            return len(self._index(schema_key))
+
+_store: Optional[ExampleStore] = None
+_store_lock = threading.Lock()
+
+def get_example_store() -> ExampleStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ExampleStore()
+        return _store
+
+# ==================== SCHEMA-KEYED HELPERS ====================
+def find_examples(schema: Dict[str, Any], question: str, k: int = MAX_PROMPT_EXAMPLES) -> List[Dict[str, Any]]:
+    """Verified examples for databases with this schema; empty if the store is unavailable"""
+    from sql_cache import schema_fingerprint
+
+    if not isinstance(schema, dict):
+        return []
+    try:
+        return get_example_store().search(schema_fingerprint(schema), question, k)
+    except sqlite3.Error as e:
+        logger.warning(f"Example store unavailable: {e}")
+        return []
+
+def record_example(schema: Dict[str, Any], question: str, sql: str):
+    from sql_cache import normalize_sql, schema_fingerprint
+
+    if not isinstance(schema, dict):
+        return
+    try:
+        get_example_store().add(schema_fingerprint(schema), question, normalize_sql(sql) + ";")
+    except sqlite3.Error as e:
+        logger.warning(f"Could not record example: {e}")
+
+def format_examples_for_prompt(examples: List[Dict[str, Any]]) -> str:
+    if not examples:
+        return ""
+    lines = ["Verified examples on this database:"]
+    for example in examples:
+        lines.append(f"Question: {example['question']}")
+        lines.append(f"SQL: {example['sql']}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,132 @@
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# NL→SQL steps of the SQL chat page, importable without Streamlit's script
+# context (see benchmarks/sql_chat_benchmark.py)
+
+@contextmanager
+def _stage(timings: Optional[Dict[str, float]], name: str) -> Iterator[None]:
+    """Add the block's wall time to timings[name] when timings are collected"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - started
+
+# ==================== PROMPTS ====================
+def format_schema_for_prompt(schema, profile=None):
+    """Format schema for LLM prompt, with value hints from the column profile if available"""
+    from sql_profiler import column_hint
+
+    if isinstance(schema, str):
+        return f"Schema error: {schema}"
+
+    prompt = "Database Schema:\n\n"
+    for table, columns in schema.items():
+        table_profile = (profile or {}).get(table, {})
+        prompt += f"Table '{table}':\n"
+        for col in columns:
+            pk = " (PRIMARY KEY)" if col["pk"] else ""
+            fk = f" (REFERENCES {col['fk']})" if col.get("fk") else ""
+            indexed = " (INDEXED)" if col.get("indexed") and not col["pk"] else ""
+            # Key columns are ids; their values tell the model nothing
+            hint = "" if col["pk"] or col.get("fk") else column_hint(table_profile.get(col["name"]))
+            hint = f" -- {hint}" if hint else ""
+            prompt += f"  - {col['name']}: {col['type']}{pk}{fk}{indexed}{hint}\n"
+        prompt += "\n"
+
+    return prompt
+
+def explanation_prompt(user_query, results):
+    """Prompt for the optional LLM explanation of a result page"""
+    return f"""The user asked: "{user_query}"
+The SQL query returned {results.total_label} rows with columns: {', '.join(results.columns)}.
+
+Provide a brief explanation of what these results show:"""
+
+# ==================== GENERATION ====================
+def generate_sql_from_natural_language(llm, schema_text, user_query, previous_sql=None, problem=None, examples=None,
+                                      dialect="SQLite"):
+    """Generate SQL from natural language (or revise previous_sql, which was rejected for problem)"""
+    from llm_providers import invoke_llm
+    from sql_examples import format_examples_for_prompt
+
+    revision = ""
+    if previous_sql:
+        revision = f"""
+A previous attempt was rejected before running:
+{previous_sql}
+Problem: {problem}
+Write a corrected query that avoids this problem.
+"""
+
+    prompt = f"""Convert this natural language question to {dialect} SQL.
+
+{schema_text}
+
+Rules:
+1. Generate ONLY the SQL query, no explanations
+2. Use {dialect} syntax
+3. Include LIMIT 10 if needed for large result sets
+4. Use proper table joins when needed
+5. Use correct column names from the schema
+
+{format_examples_for_prompt(examples)}
+Question: {user_query}
+{revision}
+SQL Query:"""
+
+    response = invoke_llm(llm, prompt)
+
+    # Clean SQL
+    if "```sql" in response:
+        response = response.split("```sql")[1].split("```")[0].strip()
+    elif "```" in response:
+        response = response.split("```")[1].split("```")[0].strip()
+
+    # Ensure semicolon
+    if not response.endswith(';'):
+        response += ';'
+
+    return response
+
+def prepare_sql_query(llm, user_query, schema, db_path, model=None,
+                      timings: Optional[Dict[str, float]] = None) -> Tuple[Any, bool]:
+    """
+    SQL for a question, validated before it runs: cached SQL is reused while it
+    still passes, and a query the validator sends back gets one revision round.
+    Returns (QueryCheck, from_cache). Pass a dict as timings to collect seconds
+    spent per stage ("schema", "generation", "validation").
+    """
+    from sql_backends import get_backend
+    from sql_cache import get_cached_sql
+    from sql_database import validate_query
+    from sql_examples import find_examples
+    from sql_profiler import get_profile
+    from sql_retrieval import prune_schema
+
+    sql = get_cached_sql(user_query, schema, model)
+    if sql is not None:
+        with _stage(timings, "validation"):
+            check = validate_query(db_path, sql)
+        if check.ok:
+            return check, True
+
+    # Generate SQL from the tables relevant to the question, guided by verified examples
+    with _stage(timings, "schema"):
+        schema_text = format_schema_for_prompt(prune_schema(schema, user_query), get_profile(db_path, schema))
+        examples = find_examples(schema, user_query)
+        dialect = get_backend(db_path).dialect_label
+    with _stage(timings, "generation"):
+        sql = generate_sql_from_natural_language(llm, schema_text, user_query, examples=examples, dialect=dialect)
+    with _stage(timings, "validation"):
+        check = validate_query(db_path, sql)
+    if check.verdict == "revise":
+        with _stage(timings, "generation"):
+            sql = generate_sql_from_natural_language(llm, schema_text, user_query, previous_sql=check.sql,
+                                                     problem=check.reason, examples=examples, dialect=dialect)
+        with _stage(timings, "validation"):
+            check = validate_query(db_path, sql)
+    return check, False
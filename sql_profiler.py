@@ -0,0 +1,136 @@
+import time
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# ==================== CONFIGURATION ====================
+PROFILE_SAMPLE_ROWS = 20000
+PROFILE_TABLE_TIMEOUT_S = 2.0
+CATEGORICAL_MAX_DISTINCT = 50
+TOP_VALUES = 5
+HINT_VALUE_CHARS = 30
+
+# {table: {column: {"rows", "nulls", "distinct", "unique", "min", "max", "top", "sampled"}}}
+Profile = Dict[str, Dict[str, Dict[str, Any]]]
+
+# ==================== PROFILING ====================
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+def profile_table(conn, table: str, columns: List[Dict[str, Any]],
+                  sample_rows: int = PROFILE_SAMPLE_ROWS) -> Dict[str, Dict[str, Any]]:
+    """Statistics for each column over the table's first sample_rows rows"""
+    source = f"(SELECT * FROM {_quote(table)} LIMIT {int(sample_rows)})"
+    rows = conn.execute(f"SELECT COUNT(*) FROM {source}").fetchone()[0]
+
+    stats = {}
+    for col in columns:
+        name = _quote(col["name"])
+        non_null, distinct, low, high = conn.execute(
+            f"SELECT COUNT({name}), COUNT(DISTINCT {name}), MIN({name}), MAX({name}) FROM {source}"
+        ).fetchone()
+        top = []
+        if 0 < distinct <= CATEGORICAL_MAX_DISTINCT:
+            top = [row[0] for row in conn.execute(
+                f"SELECT {name}, COUNT(*) FROM {source} WHERE {name} IS NOT NULL "
+                f"GROUP BY {name} ORDER BY 2 DESC LIMIT {TOP_VALUES}"
+            )]
+        stats[col["name"]] = {
+            "rows": rows,
+            "nulls": (rows - non_null) / rows if rows else 0.0,
+            "distinct": distinct,
+            "unique": distinct == non_null,
+            "min": low,
+            "max": high,
+            "top": top,
+            "sampled": rows >= sample_rows
+        }
+    return stats
+
+def profile_database(db_path: str, schema: Dict[str, List[Dict[str, Any]]]) -> Profile:
+    """Profile every table; a table that exceeds its time budget is skipped"""
+    from sql_database import QueryGuard, PROGRESS_STEPS, get_pool
+
+    profile: Profile = {}
+    with get_pool(db_path).connection() as conn:
+        for table, columns in schema.items():
+            guard = QueryGuard(timeout_s=PROFILE_TABLE_TIMEOUT_S)
+            conn.set_progress_handler(guard, PROGRESS_STEPS)
+            try:
+                profile[table] = profile_table(conn, table, columns)
+            except Exception as e:
+                logger.info(f"Skipping profile of {table}: {guard.reason or e}")
+            finally:
+                conn.set_progress_handler(None, 0)
+    return profile
+
+# ==================== BACKGROUND CACHE ====================
+_profiles: Dict[str, tuple] = {}
+_profiling: Dict[str, threading.Thread] = {}
+_profiles_lock = threading.Lock()
+
+def _run_profile(db_path: str, version: tuple, schema):
+    started = time.perf_counter()
+    try:
+        profile = profile_database(db_path, schema)
+        with _profiles_lock:
+            _profiles[db_path] = (version, profile)
+        logger.info(f"Profiled {len(profile)} tables of {db_path} in {time.perf_counter() - started:.1f}s")
+    except Exception as e:
+        logger.warning(f"Profiling {db_path} failed: {e}")
+    finally:
+        with _profiles_lock:
+            _profiling.pop(db_path, None)
+
+def get_profile(db_path: str, schema: Dict[str, List[Dict[str, Any]]]) -> Optional[Profile]:
+    """
+    Column profile for the current version of a database, or None while it is
+    being computed. Profiling runs once per database version on a background thread.
+    SQLAlchemy URLs are not profiled (an empty profile).
+    """
+    from sql_backends import is_database_url
+    from sql_database import database_version
+
+    if not isinstance(schema, dict):
+        return None
+    if is_database_url(db_path):
+        return {}
+    version = database_version(db_path)
+    path = version[0]
+    with _profiles_lock:
+        cached = _profiles.get(path)
+        if cached and cached[0] == version:
+            return cached[1]
+        if path not in _profiling:
+            thread = threading.Thread(target=_run_profile, args=(path, version, schema),
+                                      daemon=True, name="sql-profiler")
+            _profiling[path] = thread
+            thread.start()
+    return None
+
+# ==================== PROMPT HINTS ====================
+def _short(value) -> str:
+    text = str(value)
+    return text if len(text) <= HINT_VALUE_CHARS else text[:HINT_VALUE_CHARS - 1] + "…"
+
+def column_hint(stats: Optional[Dict[str, Any]]) -> str:
+    """Compact value hint for a schema line, e.g. "values: 'USA', 'Canada'" or "range 0.99..1.99" """
+    if not stats or not stats["distinct"]:
+        return "always NULL" if stats and stats["nulls"] == 1.0 else ""
+    parts = []
+    # Unique text (names, phone numbers) only helps as examples in small lookup tables
+    listable = not stats["unique"] or stats["rows"] <= CATEGORICAL_MAX_DISTINCT
+    if stats["top"] and isinstance(stats["top"][0], str) and listable:
+        values = ", ".join(repr(_short(v)) for v in stats["top"])
+        more = "" if stats["distinct"] <= len(stats["top"]) else ", ..."
+        parts.append(f"values: {values}{more}")
+    elif isinstance(stats["min"], (int, float)) and isinstance(stats["max"], (int, float)):
+        parts.append(f"range {stats['min']}..{stats['max']}")
+    elif isinstance(stats["min"], str) and stats["min"][:4].isdigit() and stats["max"][:4].isdigit():
+        # ISO-like dates stored as text
+        parts.append(f"range {_short(stats['min'])}..{_short(stats['max'])}")
+    if stats["nulls"] >= 0.5:
+        parts.append(f"{stats['nulls']:.0%} NULL")
+    return "; ".join(parts)
@@ -0,0 +1,175 @@
+import os
+import re
+import math
+import logging
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# ==================== CONFIGURATION ====================
+PRUNE_MIN_TABLES = 15
+MAX_PROMPT_TABLES = 12
+MAX_JOIN_HOPS = 3
+TABLE_NAME_WEIGHT = 3.0
+EMBEDDING_WEIGHT = 2.0
+SCHEMA_EMBEDDINGS = os.environ.get("SQL_SCHEMA_EMBEDDINGS", "0") == "1"
+
+STOPWORDS = {
+    "a", "an", "and", "are", "all", "any", "by", "each", "for", "from", "give", "has", "have", "how",
+    "in", "is", "it", "list", "me", "many", "most", "much", "of", "on", "or", "per", "show", "that",
+    "the", "their", "there", "to", "top", "what", "which", "who", "with", "find", "get", "id"
+}
+
+# ==================== TOKENIZATION ====================
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens, splitting camelCase and snake_case and dropping plural 's'"""
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", text)
+    tokens = []
+    for token in re.findall(r"[a-z0-9]+", text.lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+# ==================== SCHEMA RETRIEVER ====================
+def _fk_table(reference: str, schema: Dict[str, Any]) -> Optional[str]:
+    """Table part of a "Table.column" (or bare "Table") foreign key reference"""
+    if reference in schema:
+        return reference
+    table = reference.rsplit(".", 1)[0]
+    return table if table in schema else None
+
+class SchemaRetriever:
+    """
+    Ranks a schema's tables against a question by table and column names
+    (idf-weighted lexical overlap, optionally plus embedding similarity) and
+    connects the best matches along foreign keys so join paths stay complete.
+    """
+    def __init__(self, schema: Dict[str, List[Dict[str, Any]]], use_embeddings: bool = SCHEMA_EMBEDDINGS):
+        self.schema = schema
+        self.tables = list(schema)
+        self.table_tokens = {table: set(tokenize(table)) for table in self.tables}
+        self.column_tokens = {
+            table: {token for col in columns for token in tokenize(col["name"])}
+            for table, columns in schema.items()
+        }
+
+        document_frequency: Dict[str, int] = {}
+        for table in self.tables:
+            for token in self.table_tokens[table] | self.column_tokens[table]:
+                document_frequency[token] = document_frequency.get(token, 0) + 1
+        self.idf = {token: math.log(1 + len(self.tables) / df) for token, df in document_frequency.items()}
+
+        # Undirected foreign-key graph
+        self.neighbours: Dict[str, Set[str]] = {table: set() for table in self.tables}
+        for table, columns in schema.items():
+            for col in columns:
+                target = _fk_table(col["fk"], schema) if col.get("fk") else None
+                if target and target != table:
+                    self.neighbours[table].add(target)
+                    self.neighbours[target].add(table)
+
+        self.embedder = None
+        self.table_vectors = None
+        if use_embeddings:
+            try:
+                from document_store import get_embedder
+                self.embedder = get_embedder()
+                self.table_vectors = self.embedder.encode([
+                    f"{table}: " + ", ".join(col["name"] for col in schema[table]) for table in self.tables
+                ])
+            except Exception as e:
+                logger.warning(f"Schema embeddings unavailable: {e}")
+                self.embedder = None
+
+    def score(self, question: str) -> Dict[str, float]:
+        tokens = set(tokenize(question))
+        scores = {}
+        for table in self.tables:
+            score = 0.0
+            for token in tokens:
+                if token in self.table_tokens[table]:
+                    score += TABLE_NAME_WEIGHT * self.idf[token]
+                elif token in self.column_tokens[table]:
+                    score += self.idf[token]
+            scores[table] = score
+
+        if self.embedder is not None:
+            similarity = self.table_vectors @ self.embedder.encode([question])[0]
+            for table, value in zip(self.tables, similarity):
+                scores[table] += EMBEDDING_WEIGHT * max(0.0, float(value))
+        return scores
+
+    def _join_path(self, start: str, targets: Set[str]) -> List[str]:
+        """Shortest foreign-key path from start to any target table (excluding both ends)"""
+        previous: Dict[str, Optional[str]] = {start: None}
+        queue = deque([(start, 0)])
+        while queue:
+            table, hops = queue.popleft()
+            if table in targets and table != start:
+                path = []
+                node = previous[table]
+                while node is not None and node != start:
+                    path.append(node)
+                    node = previous[node]
+                return path
+            if hops >= MAX_JOIN_HOPS:
+                continue
+            for neighbour in sorted(self.neighbours[table]):
+                if neighbour not in previous:
+                    previous[neighbour] = table
+                    queue.append((neighbour, hops + 1))
+        return []
+
+    def select(self, question: str, max_tables: int = MAX_PROMPT_TABLES) -> List[str]:
+        """Tables relevant to the question, with the tables needed to join them"""
+        scores = self.score(question)
+        ranked = sorted((t for t in self.tables if scores[t] > 0), key=lambda t: -scores[t])
+        if not ranked:
+            # Nothing matched: fall back to the best-connected tables
+            ranked = sorted(self.tables, key=lambda t: -len(self.neighbours[t]))
+
+        selected: List[str] = []
+        for table in ranked:
+            if len(selected) >= max_tables:
+                break
+            if table in selected:
+                continue
+            bridge = self._join_path(table, set(selected)) if selected else []
+            for node in bridge + [table]:
+                if node not in selected and len(selected) < max_tables:
+                    selected.append(node)
+
+        # Spare room goes to direct neighbours of the matches (likely join/lookup tables)
+        for table in list(selected):
+            for neighbour in sorted(self.neighbours[table], key=lambda t: -scores[t]):
+                if len(selected) >= max_tables:
+                    break
+                if neighbour not in selected:
+                    selected.append(neighbour)
+        return selected
+
+_retrievers: Dict[int, SchemaRetriever] = {}
+_retrievers_lock = threading.Lock()
+
+def get_schema_retriever(schema: Dict[str, List[Dict[str, Any]]]) -> SchemaRetriever:
+    """Retriever for a schema, reused while the schema object is unchanged (see sql_database.load_schema)"""
+    with _retrievers_lock:
+        retriever = _retrievers.get(id(schema))
+        if retriever is None or retriever.schema is not schema:
+            if len(_retrievers) >= 16:
+                _retrievers.clear()
+            retriever = _retrievers[id(schema)] = SchemaRetriever(schema)
+        return retriever
+
+def prune_schema(schema: Dict[str, List[Dict[str, Any]]], question: str,
+                 max_tables: int = MAX_PROMPT_TABLES) -> Dict[str, List[Dict[str, Any]]]:
+    """Subset of the schema to put in the prompt; small schemas are returned whole"""
+    if not isinstance(schema, dict) or len(schema) <= max(PRUNE_MIN_TABLES, max_tables):
+        return schema
+    tables = set(get_schema_retriever(schema).select(question, max_tables=max_tables))
+    return {table: columns for table, columns in schema.items() if table in tables}
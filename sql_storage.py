@@ -0,0 +1,109 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+# ==================== CONFIGURATION ====================
+UPLOADS_DIR = Path(os.environ.get("SQL_UPLOADS_DIR", Path(__file__).parent / "tmp" / "sql_uploads"))
+MAX_UPLOADS_BYTES = int(os.environ.get("SQL_MAX_UPLOADS_BYTES", str(2 * 1024 ** 3)))
+MAX_UPLOADS = 50
+# Databases used within this window are never evicted, even over the limits
+MIN_IDLE_S = 3600
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+_storage_lock = threading.Lock()
+
+# ==================== CONTENT-ADDRESSED UPLOADS ====================
+def database_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def _last_used_path(path: Path) -> Path:
+    return path.with_suffix(".last_used")
+
+def touch_database(path: str):
+    """
+    Mark a stored database as recently used. Recency lives in a <sha256>.last_used
+    sidecar: the database file's own mtime is part of its identity (pools, schema
+    and result caches), so it must never change.
+    """
+    if os.path.exists(path):
+        _last_used_path(Path(path)).touch()
+
+def _last_used(path: Path) -> float:
+    """When a stored database was last marked used; files without a sidecar count from their creation"""
+    try:
+        return _last_used_path(path).stat().st_mtime
+    except FileNotFoundError:
+        return path.stat().st_mtime
+
+def store_database(data: bytes, root: Path = None) -> str:
+    """
+    Store uploaded database bytes once under <root>/<sha256>.sqlite and return the path.
+    Identical uploads from any session share the file. Raises ValueError if the
+    bytes are not an SQLite database.
+    """
+    if not data.startswith(SQLITE_HEADER):
+        raise ValueError("Not an SQLite database file")
+
+    root = Path(root or UPLOADS_DIR)
+    path = root / f"{database_digest(data)}.sqlite"
+    with _storage_lock:
+        if path.exists():
+            touch_database(str(path))
+            return str(path)
+
+        root.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+            if data[18:20] == b"\x02\x02":
+                # An uploaded WAL-mode file arrives without its -wal, so all of its
+                # content is in the main file; mark it rollback-journal so read-only
+                # connections can open it without creating WAL sidecars
+                f.seek(18)
+                f.write(b"\x01\x01")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        touch_database(str(path))
+
+    collect_garbage(root, keep=str(path))
+    return str(path)
+
+def _stored_files(root: Path) -> List[Path]:
+    return [p for p in root.glob("*.sqlite") if p.is_file()]
+
+def collect_garbage(root: Path = None, keep: str = None) -> int:
+    """Evict least recently used databases beyond MAX_UPLOADS / MAX_UPLOADS_BYTES; returns files removed"""
+    from sql_database import close_pool
+
+    root = Path(root or UPLOADS_DIR)
+    if not root.exists():
+        return 0
+
+    removed = 0
+    with _storage_lock:
+        files = sorted(_stored_files(root), key=_last_used)
+        total = sum(p.stat().st_size for p in files)
+        now = time.time()
+        for path in files:
+            if len(files) - removed <= MAX_UPLOADS and total <= MAX_UPLOADS_BYTES:
+                break
+            stat = path.stat()
+            if str(path) == keep or now - _last_used(path) < MIN_IDLE_S:
+                continue
+            close_pool(str(path))
+            for sidecar in (path, Path(f"{path}-wal"), Path(f"{path}-shm"), _last_used_path(path)):
+                try:
+                    sidecar.unlink()
+                except FileNotFoundError:
+                    pass
+            total -= stat.st_size
+            removed += 1
+            logger.info(f"Evicted stored database {path.name}")
+    return removed
@@ -0,0 +1,25 @@
+import io
+
+import document_extractors
+from document_extractors import READ_BLOCK_BYTES, extract_plain_text, stream_text
+
+def test_plain_text_utf8_across_blocks():
+    data = b"a" * (READ_BLOCK_BYTES - 1) + "é".encode("utf-8") + b" end"
+    assert "".join(extract_plain_text(io.BytesIO(data))) == "a" * (READ_BLOCK_BYTES - 1) + "é end"
+
+def test_plain_text_invalid_byte_decodes_whole_file_as_latin1():
+    # "é" straddles the first block boundary; the invalid byte comes in a later block
+    data = b"a" * (READ_BLOCK_BYTES - 1) + "é".encode("utf-8") + b"b" * READ_BLOCK_BYTES + b"\xff"
+    text = "".join(extract_plain_text(io.BytesIO(data)))
+    assert text == data.decode("latin-1")
+    assert len(text) == len(data)
+
+def test_plain_text_small_blocks(monkeypatch):
+    monkeypatch.setattr(document_extractors, "READ_BLOCK_BYTES", 3)
+    data = "ab€cd".encode("utf-8")
+    assert "".join(extract_plain_text(io.BytesIO(data))) == "ab€cd"
+    assert "".join(extract_plain_text(io.BytesIO(data + b"\x80"))) == (data + b"\x80").decode("latin-1")
+
+def test_stream_text_uses_plain_text_extractor():
+    assert "".join(stream_text("a.txt", "héllo\nworld".encode("utf-8"))) == "héllo\nworld"
+    assert "".join(stream_text("notes.md", b"caf\xe9")) == "café"
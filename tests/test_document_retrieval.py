@@ -0,0 +1,20 @@
+from document_retrieval import MAX_CONTEXT_TOKENS, MAX_EXCERPTS, count_tokens, pack_context
+from document_store import DocumentIndex, HashingEmbedder
+
+PARAGRAPH = "Refunds are issued within fourteen days of a returned order reaching the warehouse. "
+
+def test_pack_context_drops_duplicates_and_stays_within_budget():
+    index = DocumentIndex(embedder=HashingEmbedder())
+    # The same policy text in several files, plus unrelated material
+    for copy in range(6):
+        index.add_document(f"policy-{copy}.txt", PARAGRAPH * 12, "TXT")
+    index.add_document("shipping.txt", "Parcels ship from Rotterdam on weekdays by courier. " * 40, "TXT")
+
+    candidates = index.search("How long do refunds take?", top_k=12)
+    packed = pack_context(candidates, index, model="openai/gpt-oss-120b")
+
+    assert len(packed) <= MAX_EXCERPTS
+    assert sum(count_tokens(r["context"]) for r in packed) <= MAX_CONTEXT_TOKENS
+    contexts = [r["context"] for r in packed]
+    assert len(set(contexts)) == len(contexts)
+    assert len([r for r in packed if r["name"].startswith("policy-")]) == 1
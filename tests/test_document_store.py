@@ -0,0 +1,31 @@
+import document_store
+from document_store import DocumentIndex, HashingEmbedder, open_collection, save_collection
+
+def test_saving_an_index_twice_does_not_duplicate_documents(tmp_path, monkeypatch):
+    monkeypatch.setattr(document_store, "EMBEDDING_MODEL", document_store.HASHING_EMBEDDER)
+    index = DocumentIndex(embedder=HashingEmbedder())
+    index.add_document("notes.txt", "Streamlit pages share one process. " * 40, "TXT")
+    index.add_document("readme.md", "Collections are memory-mapped on disk. " * 40, "MD")
+
+    first = save_collection(index, "docs", root=tmp_path)
+    documents, chunks = len(first.documents), len(first)
+    second = save_collection(index, "docs", root=tmp_path)
+
+    assert documents == 2
+    assert len(second.documents) == documents
+    assert len(second) == chunks
+    assert len(open_collection("docs", root=tmp_path).documents) == documents
+
+def test_saving_an_edited_document_with_the_same_name_keeps_its_content(tmp_path, monkeypatch):
+    monkeypatch.setattr(document_store, "EMBEDDING_MODEL", document_store.HASHING_EMBEDDER)
+    original = DocumentIndex(embedder=HashingEmbedder())
+    original.add_document("handbook.txt", "Holidays are booked through the team lead. " * 40, "TXT")
+    save_collection(original, "docs", root=tmp_path)
+
+    edited = DocumentIndex(embedder=HashingEmbedder())
+    edited.add_document("handbook.txt", "Holidays are booked in the HR portal. " * 40, "TXT")
+    collection = save_collection(edited, "docs", root=tmp_path)
+
+    assert len(collection.documents) == 2
+    texts = [collection.chunk_text(i) for i in range(len(collection))]
+    assert any("HR portal" in text for text in texts)
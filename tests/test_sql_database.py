@@ -0,0 +1,88 @@
+import sqlite3
+
+import pytest
+
+import sql_database
+from sql_database import _outer_limit, validate_query
+
+@pytest.mark.parametrize("sql, limit", [
+    ("SELECT * FROM big", None),
+    ("SELECT * FROM big LIMIT 5", 5),
+    ("SELECT * FROM big LIMIT 5 OFFSET 10", 5),
+    ("SELECT * FROM big LIMIT 10, 5", 5),
+    ("SELECT * FROM big WHERE id IN (SELECT id FROM t LIMIT 5)", None),
+    ("WITH c AS (SELECT id FROM t LIMIT 5) SELECT * FROM big JOIN c USING (id)", None),
+    ("WITH c AS (SELECT id FROM t) SELECT * FROM c LIMIT 7", 7),
+    ("SELECT 'LIMIT 5' AS note FROM big", None),
+])
+def test_outer_limit(sql, limit):
+    assert _outer_limit(sql) == limit
+
+@pytest.fixture
+def big_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(sql_database, "LARGE_TABLE_ROWS", 100)
+    path = tmp_path / "big.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE big (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY)")
+    conn.executemany("INSERT INTO big VALUES (?, ?)", [(i, str(i)) for i in range(1, 201)])
+    conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(1, 11)])
+    conn.commit()
+    conn.close()
+    yield str(path)
+    sql_database.close_pool(str(path))
+
+def test_limit_in_subquery_does_not_bound_outer_scan(big_db):
+    check = validate_query(big_db, "SELECT * FROM big WHERE name IN (SELECT name FROM big LIMIT 5)")
+    assert check.verdict == "limited"
+    assert check.sql.endswith(f"LIMIT {sql_database.AUTO_LIMIT_ROWS}")
+
+def test_outer_limit_passes_through(big_db):
+    check = validate_query(big_db, "SELECT * FROM big LIMIT 5")
+    assert check.verdict == "ok"
+    assert check.sql == "SELECT * FROM big LIMIT 5"
+
+def _small_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY)")
+    conn.commit()
+    conn.close()
+    return str(path)
+
+def test_snapshot_copy_does_not_block_other_databases(tmp_path, monkeypatch):
+    import threading
+
+    slow, fast = _small_db(tmp_path / "slow.db"), _small_db(tmp_path / "fast.db")
+    copying, release = threading.Event(), threading.Event()
+
+    class SlowSnapshot(sql_database.Snapshot):
+        def __init__(self, db_path, version):
+            if db_path == str(tmp_path.resolve() / "slow.db"):
+                copying.set()
+                release.wait(5)
+            super().__init__(db_path, version)
+
+    monkeypatch.setattr(sql_database, "Snapshot", SlowSnapshot)
+    loader = threading.Thread(target=sql_database.get_snapshot_pool, args=(slow,))
+    loader.start()
+    try:
+        assert copying.wait(5)
+        assert sql_database.get_snapshot_pool(fast) is not None
+        assert loader.is_alive()
+    finally:
+        release.set()
+        loader.join()
+    assert sql_database.get_snapshot_pool(slow) is not None
+
+def test_replaced_snapshot_pool_reads_the_file(tmp_path):
+    import os
+
+    path = _small_db(tmp_path / "snap.db")
+    old_pool = sql_database.get_snapshot_pool(path)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    new_pool = sql_database.get_snapshot_pool(path)
+
+    assert new_pool is not old_pool
+    with old_pool.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone() == (0,)
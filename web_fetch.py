@@ -0,0 +1,227 @@
+import os
+import re
+import codecs
+import queue
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+from urllib.parse import urlsplit
+
+from document_extractors import _TextParser
+
+logger = logging.getLogger(__name__)
+
+# ==================== CONFIGURATION ====================
+MAX_CONCURRENCY = int(os.environ.get("WEB_MAX_CONCURRENCY", "8"))
+PER_HOST_LIMIT = int(os.environ.get("WEB_PER_HOST_LIMIT", "2"))
+REQUEST_TIMEOUT_S = 15.0
+FETCH_DEADLINE_S = float(os.environ.get("WEB_FETCH_DEADLINE_S", "30"))
+MAX_CHARS = 8000
+MAX_DOWNLOAD_BYTES = int(os.environ.get("WEB_MAX_DOWNLOAD_BYTES", str(2 * 1024 * 1024)))
+READ_CHUNK_BYTES = 16 * 1024
+# Content types worth downloading; anything else (PDF, video, ...) is dropped after the headers
+HTML_TYPES = {"text/html", "application/xhtml+xml"}
+TEXT_TYPES = HTML_TYPES | {"text/plain"}
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+
+# ==================== URLS AND TEXT ====================
+def normalize_url(url: str) -> str:
+    """Normalize URL"""
+    url = url.strip()
+    if not url.startswith(('http://', 'https://')):
+        url = 'https://' + url
+    return url
+
+class _PageParser(_TextParser):
+    """Visible text, with the <title> kept apart"""
+    def __init__(self):
+        super().__init__()
+        self.title_parts: List[str] = []
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        self._in_title = self._in_title or tag == "title"
+        super().handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+        super().handle_endtag(tag)
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title_parts.append(data)
+        else:
+            super().handle_data(data)
+
+    @property
+    def title(self) -> str:
+        return " ".join("".join(self.title_parts).split()) or "No title"
+
+def _charset(response, first_chunk: bytes) -> str:
+    """Charset from the Content-Type header, else a <meta charset> near the top of the page, else UTF-8"""
+    charset = response.charset_encoding
+    if not charset:
+        match = re.search(rb'<meta[^>]+charset=["\']?([\w-]+)', first_chunk[:4096], re.IGNORECASE)
+        charset = match.group(1).decode("ascii") if match else "utf-8"
+    try:
+        return codecs.lookup(charset).name
+    except LookupError:
+        return "utf-8"
+
+async def read_page(response, max_chars: int = MAX_CHARS, max_bytes: int = MAX_DOWNLOAD_BYTES,
+                    html: bool = True) -> Dict[str, Any]:
+    """
+    Decode and extract a streamed response incrementally, and stop reading once
+    max_chars of text are collected or max_bytes are downloaded; the rest of
+    the body is never transferred.
+    """
+    parser = _PageParser() if html else None
+    decoder = None
+    pieces: List[str] = []
+    collected = received = 0
+    complete = True
+
+    def collect(text: str) -> int:
+        if parser is not None:
+            parser.feed(text)
+            text = parser.drain()
+        text = re.sub(r'\s+', ' ', text)
+        pieces.append(text)
+        return len(text.strip())
+
+    async for chunk in response.aiter_bytes(READ_CHUNK_BYTES):
+        if decoder is None:
+            decoder = codecs.getincrementaldecoder(_charset(response, chunk))(errors="replace")
+        received += len(chunk)
+        collected += collect(decoder.decode(chunk))
+        if collected > max_chars or received >= max_bytes:
+            complete = False
+            break
+    if complete and decoder is not None:
+        collect(decoder.decode(b"", final=True))
+        if parser is not None:
+            parser.close()
+            collect("")
+
+    text = re.sub(r'\s+', ' ', "".join(pieces)).strip()
+    if len(text) > max_chars:
+        text = text[:max_chars] + "..."
+    return {
+        "title": parser.title if parser is not None else "No title",
+        "content": text,
+        "bytes": received,
+        "truncated": not complete
+    }
+
+def _failure(url: str, error: str) -> Dict[str, Any]:
+    return {"success": False, "error": error, "url": url}
+
+# ==================== CONCURRENT FETCHING ====================
+async def fetch_one(client, url: str, global_limit: asyncio.Semaphore, host_limits: Dict[str, asyncio.Semaphore],
+                    max_chars: int = MAX_CHARS) -> Dict[str, Any]:
+    """Stream one page under the global and per-host limits; never raises"""
+    import httpx
+
+    host = urlsplit(url).hostname or url
+    host_limit = host_limits.setdefault(host, asyncio.Semaphore(PER_HOST_LIMIT))
+    try:
+        # Wait for the host first, so tasks queued on a busy host do not hold global slots
+        async with host_limit, global_limit:
+            async with client.stream("GET", url) as response:
+                response.raise_for_status()
+                content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+                if content_type and content_type not in TEXT_TYPES:
+                    return _failure(url, f"Unsupported content type ({content_type})")
+                page = await read_page(response, max_chars, html=content_type != "text/plain")
+        return {
+            "success": True,
+            "url": url,
+            "title": page["title"],
+            "content": page["content"],
+            "length": len(page["content"]),
+            "status_code": response.status_code,
+            "bytes": page["bytes"],
+            "truncated": page["truncated"]
+        }
+    except httpx.TimeoutException:
+        return _failure(url, f"Timeout ({REQUEST_TIMEOUT_S:g} seconds)")
+    except httpx.ConnectError as e:
+        return _failure(url, "SSL Error" if "SSL" in str(e) or "CERTIFICATE" in str(e) else "Connection Failed")
+    except httpx.HTTPError as e:
+        return _failure(url, f"Request Error: {str(e).splitlines()[0][:100]}")
+    except Exception as e:
+        return _failure(url, f"Error: {str(e)[:100]}")
+
+async def _fetch_all(urls: List[str], results: "queue.Queue", deadline_s: float, max_chars: int):
+    import httpx
+
+    global_limit = asyncio.Semaphore(MAX_CONCURRENCY)
+    host_limits: Dict[str, asyncio.Semaphore] = {}
+    limits = httpx.Limits(max_connections=MAX_CONCURRENCY, max_keepalive_connections=MAX_CONCURRENCY)
+    async with httpx.AsyncClient(headers=HEADERS, timeout=REQUEST_TIMEOUT_S, limits=limits,
+                                 follow_redirects=True) as client:
+        tasks = {asyncio.ensure_future(fetch_one(client, url, global_limit, host_limits, max_chars)): url for url in urls}
+        try:
+            for future in asyncio.as_completed(tasks, timeout=deadline_s):
+                results.put(await future)
+        except asyncio.TimeoutError:
+            for task, url in tasks.items():
+                if not task.done():
+                    task.cancel()
+                    results.put(_failure(url, f"Deadline exceeded ({deadline_s:g} seconds)"))
+        finally:
+            for task in tasks:
+                task.cancel()
+
+def fetch_websites(urls: List[str], deadline_s: float = FETCH_DEADLINE_S,
+                   max_chars: int = MAX_CHARS) -> Iterator[Dict[str, Any]]:
+    """
+    Fetch pages concurrently (at most MAX_CONCURRENCY at once, PER_HOST_LIMIT
+    per host) and yield each result dict as it completes, in completion order.
+    Pages still loading after deadline_s are yielded as failures. The fetches
+    run on an event loop in a background thread, so this can be consumed from
+    a Streamlit script; closing the generator early cancels them.
+    """
+    import httpx  # noqa: F401 - fail here, in the caller, if it is missing
+
+    urls = list(dict.fromkeys(normalize_url(url) for url in urls))
+    results: "queue.Queue" = queue.Queue()
+    loop = asyncio.new_event_loop()
+    main: Dict[str, Optional[asyncio.Task]] = {"task": None}
+
+    def run():
+        asyncio.set_event_loop(loop)
+        main["task"] = loop.create_task(_fetch_all(urls, results, deadline_s, max_chars))
+        try:
+            loop.run_until_complete(main["task"])
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.warning(f"Website fetching failed: {e}")
+        finally:
+            loop.close()
+            results.put(None)
+
+    thread = threading.Thread(target=run, daemon=True, name="web-fetch")
+    thread.start()
+    pending = set(urls)
+    try:
+        while pending:
+            result = results.get()
+            if result is None:
+                break
+            pending.discard(result["url"])
+            yield result
+        for url in pending:
+            yield _failure(url, "Error: fetch did not complete")
+    finally:
+        task = main["task"]
+        if thread.is_alive() and task is not None:
+            try:
+                loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:
+                pass  # The loop closed in the meantime